@@ -10,6 +10,7 @@ and enables CORS for frontend access.
 from flask import Flask
 from flask_cors import CORS
 import os
+import threading
 
 # Import routes
 from routes.ollama_routes import bp as chat_bp       # regular Ollama chat route
@@ -35,6 +36,13 @@ def create_app():
     app.register_blueprint(history_bp)
     app.register_blueprint(auth_bp)
 
+    # Build the retriever (chromadb, BM25, corpus seeding) off the request path so
+    # the port binds immediately; set RETRIEVER_WARMUP=0 to defer it to first use
+    if os.environ.get("RETRIEVER_WARMUP", "1").lower() in ("1", "true", "yes"):
+        from rag.retriever import get_retriever
+
+        threading.Thread(target=get_retriever, name="retriever-warmup", daemon=True).start()
+
     return app
 
 
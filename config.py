@@ -9,6 +9,13 @@ DATA_DIR.mkdir(exist_ok=True)
 # Ollama / LLM settings
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Pooled HTTP connections to Ollama (max concurrent requests), timeouts in seconds
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "8"))
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3.0"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+OLLAMA_RETRIES = int(os.getenv("OLLAMA_RETRIES", "2"))
+# Max LLM calls running at once; interactive chat is admitted before agent work
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "2"))
 
 # Vector database + legal corpus
 VECTOR_DB_DIR = os.getenv("VECTOR_DB_DIR", str(BASE_DIR / "rag" / "vectordb"))
@@ -16,9 +23,64 @@ LEGAL_DATA_FILE = os.getenv("LEGAL_DATA_FILE", str(DATA_DIR / "combined.json"))
 
 # Chat history persistence
 CHAT_HISTORY_FILE = os.getenv("CHAT_HISTORY_FILE", str(DATA_DIR / "chat_history.json"))
+# History sent with each chat turn: recent turns verbatim, relevant older
+# messages and a rolling summary of the rest, within HISTORY_TOKEN_BUDGET
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_RECENT_TURNS = int(os.getenv("HISTORY_RECENT_TURNS", "3"))
+HISTORY_RELEVANT_MESSAGES = int(os.getenv("HISTORY_RELEVANT_MESSAGES", "4"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "256"))
+HISTORY_SUMMARY_FILE = os.getenv("HISTORY_SUMMARY_FILE", str(DATA_DIR / "chat_summaries.json"))
 
 # Prompt defaults
 DEFAULT_CHAT_SYSTEM_PROMPT = os.getenv(
     "DEFAULT_CHAT_SYSTEM_PROMPT",
     "You are LexiGPT, an Indian legal assistant. Provide precise, well-structured, and citation-backed answers.",
-)
\ No newline at end of file
+)
+# Retrieval tuning
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "512"))
+RETRIEVER_CONCURRENT = os.getenv("RETRIEVER_CONCURRENT", "1").lower() in ("1", "true", "yes")
+RETRIEVER_MAX_WORKERS = int(os.getenv("RETRIEVER_MAX_WORKERS", "8"))
+RETRIEVER_SOURCE_TIMEOUT = float(os.getenv("RETRIEVER_SOURCE_TIMEOUT", "5.0"))
+BM25_INDEX_FILE = os.getenv("BM25_INDEX_FILE", str(DATA_DIR / "bm25_index.json"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+RETRIEVER_MIN_SCORE = float(os.getenv("RETRIEVER_MIN_SCORE", "0.25"))
+# Query embeddings from concurrent requests are batched for up to this window
+EMBED_BATCH_WINDOW_MS = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_BATCH_MAX = int(os.getenv("EMBED_BATCH_MAX", "32"))
+# Unix socket of the shared embedding server (python -m rag.embedding_server); empty = embed in-process
+EMBED_SERVER_SOCKET = os.getenv("EMBED_SERVER_SOCKET", "")
+# On-disk cache of document embeddings, keyed by (model id, text hash)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", str(DATA_DIR / "embed_cache"))
+# Live chat messages are indexed in the background, in batches
+CHAT_INDEX_FLUSH_INTERVAL = float(os.getenv("CHAT_INDEX_FLUSH_INTERVAL", "2.0"))
+CHAT_INDEX_BATCH_SIZE = int(os.getenv("CHAT_INDEX_BATCH_SIZE", "64"))
+CHAT_INDEX_STATE_FILE = os.getenv("CHAT_INDEX_STATE_FILE", str(DATA_DIR / "chat_index_state.json"))
+VECTOR_DB_WRITE_BATCH = int(os.getenv("VECTOR_DB_WRITE_BATCH", "256"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+
+# Semantic answer cache for RAG queries
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+ANSWER_CACHE_FILE = os.getenv("ANSWER_CACHE_FILE", str(DATA_DIR / "answer_cache.json"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+# Prompt context for RAG answers; ~350 tokens matches the old three-snippet prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "350"))
+
+# Exact-match cache for low-temperature LLM calls (planner, evaluator, explain)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", str(DATA_DIR / "llm_cache.jsonl"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+# Calls sampled above this temperature are never cached
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.3"))
+
+# Vector storage backend per VectorDB collection: "chroma" (HNSW) or "flat" (exact NumPy)
+VECTOR_DB_BACKEND = os.getenv("VECTOR_DB_BACKEND", "chroma")
+# Seed the vector corpus in a background thread (BM25-only retrieval until done)
+SEED_IN_BACKGROUND = os.getenv("SEED_IN_BACKGROUND", "1").lower() in ("1", "true", "yes")
+# Session-scoped uploads live in per-session partitions under this directory
+SESSION_PARTITION_DIR = os.getenv("SESSION_PARTITION_DIR", str(Path(VECTOR_DB_DIR) / "sessions"))
@@ -22,8 +22,9 @@ try:
         DB_DIR,
         partition_pdf_text,
         chunk_text,
-        model,
-        collection,
+        EMBED_MODEL,
+        embed_texts,
+        get_collection,
         process_pdf,
     )
 except Exception:
@@ -32,10 +33,12 @@ except Exception:
         DB_DIR,
         partition_pdf_text,
         chunk_text,
-        model,
-        collection,
+        EMBED_MODEL,
+        embed_texts,
+        get_collection,
         process_pdf,
     )
+from rag.embedding_cache import cached_embed
 
 LOG_PATH = Path("data/agent_logs.jsonl")
 
@@ -96,15 +99,15 @@ class SimpleIngestAgent:
         return chunk_text(text)
 
     def embed_skill(self, chunks: List[str]) -> List[List[float]]:
-        # model is imported from build_law_chromadb (SentenceTransformer)
+        # embed_texts comes from build_law_chromadb (embedding server or local SentenceTransformer);
+        # vectors for chunks seen before come from the on-disk embedding cache instead
         if not chunks:
             return []
         out = []
         total = len(chunks)
         for i in range(0, total, self.embed_batch_size):
             batch = chunks[i : i + self.embed_batch_size]
-            emb = model.encode(batch)
-            out.extend(emb.tolist())
+            out.extend(cached_embed(batch, embed_texts, EMBED_MODEL))
             # per-batch progress log
             self._log({
                 "ts": datetime.now(timezone.utc).isoformat(),
@@ -119,7 +122,7 @@ class SimpleIngestAgent:
     def store_skill(self, pdf_name: str, chunks: List[str], embeddings: List[List[float]]):
         ids = [f"{pdf_name}_{i}" for i in range(len(chunks))]
         metadatas = [{"source": pdf_name, "chunk_id": i} for i in range(len(chunks))]
-        collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=chunks)
+        get_collection().add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=chunks)
 
     def act(self, target: Path):
         target_str = str(target)
@@ -254,7 +257,7 @@ class SimpleIngestAgent:
             pdf_name = os.path.basename(target_str)
             ids = [f"{pdf_name}_{i}" for i in range(len(chunks))]
             metadatas = [{"source": pdf_name, "chunk_id": i} for i in range(len(chunks))]
-            collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=chunks)
+            get_collection().add(ids=ids, embeddings=embeddings, metadatas=metadatas, documents=chunks)
         except Exception as e:
             store_error = repr(e)
         store_duration = round(time.time() - store_start, 2)
@@ -1,9 +1,17 @@
 import os
-import chromadb
-from chromadb.config import Settings
+import sys
+import threading
+from pathlib import Path
+
 from pypdf import PdfReader
-from sentence_transformers import SentenceTransformer
-from unstructured.partition.pdf import partition_pdf
+
+# Project root on sys.path so the rag package imports when run as a script
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from config import EMBED_SERVER_SOCKET
+from rag.embedding_cache import cached_embed
 
 # Try to import langchain's text splitter; provide a lightweight
 # fallback if it's not available in the environment.
@@ -57,9 +65,37 @@ EMBED_MODEL = "BAAI/bge-large-en"  # VERY GOOD
 # ==========================================================
 # LOAD EMBEDDING MODEL
 # ==========================================================
+# The model, unstructured and chromadb are heavy; they load on first use so
+# importing this module (e.g. via data.agent) stays cheap.
+
+_model = None
+_remote = None
+_collection = None
+_lazy_lock = threading.Lock()
+
+
+def get_model():
+    """Return the SentenceTransformer, loading it on first call."""
+    global _model
+    with _lazy_lock:
+        if _model is None:
+            from sentence_transformers import SentenceTransformer
 
-print("Loading embedding model...")
-model = SentenceTransformer(EMBED_MODEL)
+            print("Loading embedding model...")
+            _model = SentenceTransformer(EMBED_MODEL)
+    return _model
+
+
+def embed_texts(texts):
+    """Embed with EMBED_MODEL, via the shared embedding server when one is configured."""
+    global _remote
+    if EMBED_SERVER_SOCKET:
+        if _remote is None:
+            from rag.embedding_server import RemoteEmbeddingFunction
+
+            _remote = RemoteEmbeddingFunction(EMBED_SERVER_SOCKET, model=EMBED_MODEL, fallback=lambda t: get_model().encode(t))
+        return [vec.tolist() for vec in _remote(texts)]
+    return get_model().encode(texts).tolist()
 
 
 # ==========================================================
@@ -100,6 +136,8 @@ def extract_pdf_text(pdf_path):
 def partition_pdf_text(pdf_path):
     """Uses unstructured (much better for legal docs)."""
     try:
+        from unstructured.partition.pdf import partition_pdf
+
         elements = partition_pdf(pdf_path)
         text = "\n".join([str(el) for el in elements])
         return clean_text(text)
@@ -128,18 +166,26 @@ def chunk_text(text):
 # INITIALIZE CHROMA DB
 # ==========================================================
 
-client = chromadb.Client(
-    Settings(
-        # Use the new non-legacy persistent configuration
-        is_persistent=True,
-        persist_directory=DB_DIR,
-    )
-)
+def get_collection():
+    """Return the indian_law_docs collection, opening the client on first call."""
+    global _collection
+    with _lazy_lock:
+        if _collection is None:
+            import chromadb
+            from chromadb.config import Settings
 
-collection = client.get_or_create_collection(
-    name="indian_law_docs",
-    metadata={"hnsw:space": "cosine"}
-)
+            client = chromadb.Client(
+                Settings(
+                    # Use the new non-legacy persistent configuration
+                    is_persistent=True,
+                    persist_directory=DB_DIR,
+                )
+            )
+            _collection = client.get_or_create_collection(
+                name="indian_law_docs",
+                metadata={"hnsw:space": "cosine"}
+            )
+    return _collection
 
 
 # ==========================================================
@@ -160,15 +206,15 @@ def process_pdf(pdf_path):
     chunks = chunk_text(text)
     print(f" - Total chunks: {len(chunks)}")
 
-    # 3. embed
-    embeddings = model.encode(chunks).tolist()
+    # 3. embed (chunks embedded by an earlier run come from the embedding cache)
+    embeddings = cached_embed(chunks, embed_texts, EMBED_MODEL)
 
     # 4. prepare metadata
     ids = [f"{pdf_name}_{i}" for i in range(len(chunks))]
     metadatas = [{"source": pdf_name, "chunk_id": i} for i in range(len(chunks))]
 
     # 5. store in chroma
-    collection.add(
+    get_collection().add(
         ids=ids,
         embeddings=embeddings,
         metadatas=metadatas,
@@ -195,8 +241,7 @@ def main():
         pdf_path = os.path.join(PDF_FOLDER, pdf)
         process_pdf(pdf_path)
 
-    # Save the DB
-    client.persist()
+    # The persistent client writes through, so there is no separate save step
     print("\n🎉 DONE! Your ChromaDB is ready at:", DB_DIR)
 
 
@@ -0,0 +1,276 @@
+"""
+rag/bm25_index.py
+Lexical BM25 inverted index over the legal corpus.
+
+The index is built once from `data/combined.json` (the same rows VectorDB seeds
+from), extended with uploaded document chunks, and persisted as JSON so later
+processes load it instead of re-tokenising the corpus. It complements the
+vector search: exact section numbers and defined terms score well here even
+when the embedding model blurs them, and it keeps retrieval useful when the
+vector DB is unavailable.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import BM25_INDEX_FILE, LEGAL_DATA_FILE
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or shall such that the this to was which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; keeps numbers so section references match."""
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """In-memory BM25 (Okapi) index with JSON persistence.
+
+    Documents are stored as {id, title, content, metadata, origin}. `origin` is
+    "seed" for rows from the corpus file and "upload" for chunks added later, so
+    a rebuild after the corpus file changes keeps uploaded chunks.
+    """
+
+    VERSION = 1
+
+    def __init__(self, index_path: Optional[Path] = None, k1: float = 1.5, b: float = 0.75) -> None:
+        self.index_path = Path(index_path or BM25_INDEX_FILE)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        # Bumped on every content change; lets caches detect a new corpus version
+        self.revision = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.doc_lens: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self._id_to_idx: Dict[str, int] = {}
+        self._total_len = 0
+        self._live = 0
+        self.source_mtime: Optional[float] = None
+
+    # ------------------------------------------------------------------ #
+    def __len__(self) -> int:
+        return self._live
+
+    def _index_doc(self, doc: Dict[str, Any]) -> bool:
+        doc_id = doc["id"]
+        existing = self._id_to_idx.get(doc_id)
+        if existing is not None:
+            old = self.docs[existing]
+            if old is not None and old.get("content") == doc.get("content"):
+                return False
+            self._remove_idx(existing)
+
+        idx = len(self.docs)
+        tokens = tokenize(f"{doc.get('title', '')} {doc.get('content', '')}")
+        tf: Dict[str, int] = {}
+        for tok in tokens:
+            tf[tok] = tf.get(tok, 0) + 1
+        for tok, count in tf.items():
+            self.postings.setdefault(tok, {})[idx] = count
+        self.docs.append(doc)
+        self.doc_lens.append(len(tokens))
+        self._id_to_idx[doc_id] = idx
+        self._total_len += len(tokens)
+        self._live += 1
+        return True
+
+    def _remove_idx(self, idx: int) -> None:
+        doc = self.docs[idx]
+        if doc is None:
+            return
+        for tok in set(tokenize(f"{doc.get('title', '')} {doc.get('content', '')}")):
+            plist = self.postings.get(tok)
+            if plist is not None:
+                plist.pop(idx, None)
+                if not plist:
+                    del self.postings[tok]
+        self._total_len -= self.doc_lens[idx]
+        self.doc_lens[idx] = 0
+        self.docs[idx] = None
+        self._id_to_idx.pop(doc.get("id"), None)
+        self._live -= 1
+
+    # ------------------------------------------------------------------ #
+    def add(self, docs: Sequence[Dict[str, Any]], origin: str = "upload", persist: bool = True) -> int:
+        """Index documents given as {id, content, title?, metadata?}. Returns how many were newly indexed.
+
+        Re-adding an id with identical content is a no-op; changed content replaces it.
+        """
+        added = 0
+        with self._lock:
+            for doc in docs:
+                content = (doc.get("content") or "").strip()
+                if not content or not doc.get("id"):
+                    continue
+                changed = self._index_doc(
+                    {
+                        "id": str(doc["id"]),
+                        "title": doc.get("title") or (doc.get("metadata") or {}).get("title") or "Legal Reference",
+                        "content": content,
+                        "metadata": dict(doc.get("metadata") or {}),
+                        "origin": origin,
+                    }
+                )
+                added += int(changed)
+            if added:
+                self.revision += 1
+                if persist:
+                    self.save()
+        return added
+
+    # ------------------------------------------------------------------ #
+    def search(self, query: str, top_k: int = 3, where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Return top_k hits as dicts: {title, content, score, metadata}.
+
+        `where` is an equality filter over document metadata, mirroring the
+        subset of Chroma's `where` used by the retriever.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            if not self._live:
+                return []
+            n_docs = self._live
+            avgdl = self._total_len / n_docs if n_docs else 0.0
+            scores: Dict[int, float] = {}
+            for term in set(terms):
+                plist = self.postings.get(term)
+                if not plist:
+                    continue
+                df = len(plist)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                for idx, tf in plist.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lens[idx] / avgdl) if avgdl else self.k1
+                    scores[idx] = scores.get(idx, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if where:
+                scores = {
+                    idx: sc
+                    for idx, sc in scores.items()
+                    if all((self.docs[idx]["metadata"] or {}).get(k) == v for k, v in where.items())
+                }
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [
+                {
+                    "title": self.docs[idx]["title"],
+                    "content": self.docs[idx]["content"],
+                    "score": score,
+                    "metadata": self.docs[idx]["metadata"],
+                }
+                for idx, score in best
+            ]
+
+    # ------------------------------------------------------------------ #
+    def build_from_corpus(self, json_path: Path) -> None:
+        """(Re)build the seed part of the index from combined.json, keeping uploaded docs."""
+        json_path = Path(json_path)
+        with self._lock:
+            uploads = [d for d in self.docs if d is not None and d.get("origin") != "seed"]
+            self._reset()
+            try:
+                with json_path.open("r", encoding="utf-8") as fh:
+                    rows = json.load(fh)
+                self.source_mtime = json_path.stat().st_mtime
+            except (OSError, json.JSONDecodeError):
+                rows = []
+            for idx, row in enumerate(rows):
+                content = (row.get("description") or "").strip()
+                if not content:
+                    continue
+                title = row.get("title") or f"Clause {idx+1}"
+                # ids mirror VectorDB._maybe_seed so both indexes describe the same rows
+                self._index_doc(
+                    {"id": f"doc-{idx}", "title": title, "content": content, "metadata": {"title": title}, "origin": "seed"}
+                )
+            for doc in uploads:
+                self._index_doc(doc)
+            self.revision += 1
+            self.save()
+
+    def save(self) -> None:
+        """Persist the index (documents + postings) to `index_path`."""
+        with self._lock:
+            live = [d for d in self.docs if d is not None]
+            remap = {old: new for new, old in enumerate(i for i, d in enumerate(self.docs) if d is not None)}
+            payload = {
+                "version": self.VERSION,
+                "revision": self.revision,
+                "source_mtime": self.source_mtime,
+                "docs": live,
+                "doc_lens": [self.doc_lens[old] for old in remap],
+                "postings": {
+                    term: [[remap[idx], tf] for idx, tf in plist.items()] for term, plist in self.postings.items()
+                },
+            }
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_suffix(self.index_path.suffix + ".tmp")
+        with tmp.open("w", encoding="utf-8") as fh:
+            json.dump(payload, fh, ensure_ascii=False)
+        tmp.replace(self.index_path)
+
+    def load(self) -> bool:
+        """Load a persisted index. Returns False when missing or incompatible."""
+        if not self.index_path.exists():
+            return False
+        try:
+            with self.index_path.open("r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if payload.get("version") != self.VERSION:
+            return False
+        with self._lock:
+            self._reset()
+            self.docs = payload.get("docs", [])
+            self.doc_lens = payload.get("doc_lens", [])
+            self.postings = {
+                term: {int(idx): int(tf) for idx, tf in plist} for term, plist in payload.get("postings", {}).items()
+            }
+            self._id_to_idx = {d["id"]: i for i, d in enumerate(self.docs)}
+            self._total_len = sum(self.doc_lens)
+            self._live = len(self.docs)
+            self.source_mtime = payload.get("source_mtime")
+            self.revision = int(payload.get("revision", 0))
+        return True
+
+    def load_or_build(self, json_path: Path) -> None:
+        """Load the persisted index, rebuilding it if the corpus file has changed."""
+        json_path = Path(json_path)
+        loaded = self.load()
+        try:
+            mtime = json_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if not loaded or (mtime is not None and mtime != self.source_mtime):
+            self.build_from_corpus(json_path)
+
+
+# Process-wide index shared by the retriever and upload ingestion
+_index: Optional[BM25Index] = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index() -> BM25Index:
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = BM25Index()
+            index.load_or_build(Path(LEGAL_DATA_FILE))
+            _index = index
+    return _index
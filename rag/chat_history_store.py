@@ -2,153 +2,320 @@
 rag/chat_history_store.py
 
 Manages a ChromaDB collection for user chat history.
-- Seeds collection from `data/chat_history.json`
-- Provides `add_message`, `bulk_add_from_file`, and `search` methods
+- Syncs the collection with `data/chat_history.json` incrementally, tracking a
+  per-session high-water mark (see `sync_from_file`)
+- Provides `add_message`, `sync_from_file`, and `search` methods
+- `add_message` only queues; a background writer embeds and stores queued
+  messages in batches every CHAT_INDEX_FLUSH_INTERVAL seconds (and on exit)
 
 The collection stores each message as a document with metadata:
 { "session_id": ..., "role": "user|assistant", "idx": N }
+Live messages are keyed by content hash, so repeated texts (canned replies)
+are embedded and stored once.
 
 This module uses the DefaultEmbeddingFunction for offline embedding (works
 without external embedding provider). It uses the same persistent directory as
-other vector stores (config.VECTOR_DB_DIR).
+other vector stores (config.VECTOR_DB_DIR), and shares their client and
+embedding model through rag.chroma_registry.
 """
 from __future__ import annotations
 
 from pathlib import Path
+import atexit
+import hashlib
 import json
-import os
+import threading
 from typing import List, Dict, Any, Optional
 
-import chromadb
-from chromadb.utils import embedding_functions
-
-from config import VECTOR_DB_DIR, CHAT_HISTORY_FILE
+from config import (
+    CHAT_HISTORY_FILE,
+    CHAT_INDEX_BATCH_SIZE,
+    CHAT_INDEX_FLUSH_INTERVAL,
+    CHAT_INDEX_STATE_FILE,
+    VECTOR_DB_DIR,
+)
+from .chroma_registry import (
+    distance_space,
+    embed_documents,
+    get_client,
+    get_collection,
+    get_embedding_function,
+    get_query_embedder,
+)
 
 
 class ChatHistoryStore:
     def __init__(self, persist_dir: Optional[Path] = None, collection_name: str = "chat_history") -> None:
         self.persist_dir = Path(persist_dir or VECTOR_DB_DIR)
-        self.persist_dir.mkdir(parents=True, exist_ok=True)
 
-        # Use PersistentClient if available; chroma has multiple client implementations
+        # Client, collection and embedding model are shared process-wide
+        self.client = get_client(self.persist_dir)
+        self.embedding_fn = get_embedding_function()
+        self.query_embedder = get_query_embedder()
+        self.collection = get_collection(self.persist_dir, collection_name, metadata={"hnsw:space": "cosine"})
+        # Collections created before the space was set keep Chroma's squared-L2 distance
+        self.space = distance_space(self.collection)
+
+        # Write-behind queue for live messages, drained by a lazily started writer thread
+        self._pending: List[Dict[str, Any]] = []
+        self._pending_cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._indexed_ids: set = set()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        # Set while the last flush failed; the writer then waits a full interval before retrying
+        self._flush_failed = False
+
+        # Per-session high-water marks: {session_id: {"idx": N, "hash": ...}} of the
+        # last message known to be indexed, so syncs only touch newer messages
+        self.state_path = Path(CHAT_INDEX_STATE_FILE)
+        self._state: Dict[str, Dict[str, Any]] = self._load_state()
+        # Tag derived from the marks; changes whenever indexed history does (see Retriever.corpus_version)
+        self.revision = self._state_revision()
+
+        # Index whatever CHAT_HISTORY_FILE gained since the last run
         try:
-            self.client = chromadb.PersistentClient(path=str(self.persist_dir))
+            self.sync_from_file(Path(CHAT_HISTORY_FILE))
         except Exception:
-            # fallback to regular client with settings
-            from chromadb.config import Settings
-            self.client = chromadb.Client(Settings(persist_directory=str(self.persist_dir)))
+            # silently ignore seeding errors; collection remains usable
+            pass
 
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
 
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_fn,
-        )
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with self.state_path.open("r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, json.JSONDecodeError):
+            return {}
 
-        # If collection empty, attempt to seed from CHAT_HISTORY_FILE
-        if self.collection.count() == 0:
-            try:
-                self.bulk_add_from_file(Path(CHAT_HISTORY_FILE))
-            except Exception:
-                # silently ignore seeding errors; collection remains usable
-                pass
+    def _state_revision(self) -> str:
+        raw = json.dumps(self._state, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
 
-    # ------------------------------------------------------------------ #
-    def _flatten_messages(self, sessions: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Convert chat_history.json sessions dict into list of message dicts.
+    def _save_state(self) -> None:
+        self.revision = self._state_revision()
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(self.state_path.suffix + ".tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                json.dump(self._state, fh)
+            tmp.replace(self.state_path)
+        except OSError:
+            pass
+
+    def _advance_marks(self, items: List[Dict[str, Any]]) -> None:
+        """Move each session's high-water mark over indexed items that directly follow it."""
+        for item in items:
+            meta = item["metadata"]
+            idx = meta.get("idx")
+            if idx is None:
+                continue
+            mark = self._state.get(meta["session_id"])
+            if idx == (mark["idx"] + 1 if mark else 0):
+                self._state[meta["session_id"]] = {"idx": idx, "hash": self._text_hash(item["content"])}
+
+    def _new_messages(self, sessions: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Messages past each session's high-water mark, as {content, metadata} items.
 
-        Each returned item: {"id": <str>, "content": <text>, "metadata": {...}}
-        metadata contains session_id, role, idx (position in session), title
+        A session whose marked message no longer matches (history edited or
+        truncated) is scanned from the start; content-hash ids keep that cheap.
         """
         items: List[Dict[str, Any]] = []
         for session_id, session_obj in sessions.items():
-            title = session_obj.get("title") if isinstance(session_obj, dict) else None
-            messages = (session_obj or {}).get("messages", []) if isinstance(session_obj, dict) else []
-            for idx, msg in enumerate(messages):
-                role = msg.get("role", "user")
-                text = (msg.get("text") or "").strip()
-                if not text:
-                    continue
-                doc_id = f"{session_id}::{idx}"
-                items.append({
-                    "id": doc_id,
-                    "content": text,
-                    "metadata": {"session_id": session_id, "role": role, "idx": idx, "title": title},
-                })
+            if not isinstance(session_obj, dict):
+                continue
+            title = session_obj.get("title")
+            messages = session_obj.get("messages", []) or []
+            start = 0
+            mark = self._state.get(session_id)
+            if mark and mark["idx"] < len(messages):
+                marked_text = (messages[mark["idx"]].get("text") or "").strip()
+                if self._text_hash(marked_text) == mark["hash"]:
+                    start = mark["idx"] + 1
+            if start == 0:
+                self._state.pop(session_id, None)
+            for idx in range(start, len(messages)):
+                msg = messages[idx]
+                meta: Dict[str, Any] = {"session_id": session_id, "role": msg.get("role", "user"), "idx": idx}
+                if title:
+                    meta["title"] = title
+                items.append({"content": (msg.get("text") or "").strip(), "metadata": meta})
         return items
 
     # ------------------------------------------------------------------ #
-    def bulk_add_from_file(self, json_path: Path) -> None:
-        """Load `json_path` (chat_history.json) and add messages to the collection."""
+    def sync_from_file(self, json_path: Optional[Path] = None) -> int:
+        """Index messages of `json_path` (chat_history.json) added since the last sync.
+
+        Runs at startup and on demand; new messages are embedded and written in
+        batches of CHAT_INDEX_BATCH_SIZE. Returns how many were written.
+        """
+        json_path = Path(json_path or CHAT_HISTORY_FILE)
         if not json_path.exists():
-            return
+            return 0
         with json_path.open("r", encoding="utf-8") as fh:
             try:
                 data = json.load(fh)
             except json.JSONDecodeError:
-                return
+                return 0
+        if not isinstance(data, dict):
+            return 0
 
-        flat = self._flatten_messages(data)
-        if not flat:
-            return
+        # Collections indexed before marks existed used "<session>::<idx>" ids
+        legacy = not self.state_path.exists() and self.collection.count() > 0
+        # Drain the live queue first so the marks below see its messages
+        self.flush()
+        written = 0
+        with self._flush_lock:
+            items = self._new_messages(data)
+            for start in range(0, len(items), CHAT_INDEX_BATCH_SIZE):
+                batch = items[start : start + CHAT_INDEX_BATCH_SIZE]
+                todo = [it for it in batch if it["content"]]
+                if legacy and todo:
+                    legacy_ids = [f"{it['metadata']['session_id']}::{it['metadata']['idx']}" for it in todo]
+                    present = set(self.collection.get(ids=legacy_ids, include=[]).get("ids", []))
+                    todo = [it for it, legacy_id in zip(todo, legacy_ids) if legacy_id not in present]
+                written += self._write_messages(todo)
+                self._advance_marks(batch)
+            self._save_state()
+        return written
 
-        # Prepare lists
-        ids = [it["id"] for it in flat]
-        docs = [it["content"] for it in flat]
-        metas = [it["metadata"] for it in flat]
-
-        # Add only those ids not already present (avoid duplicates)
-        # Chroma doesn't have a simple contains API across clients, so we'll try add and ignore duplicates
-        try:
-            # If collection supports count, we can check but ids uniqueness matters
-            self.collection.add(documents=docs, metadatas=metas, ids=ids)
-        except Exception:
-            # In case add fails (e.g., duplicate ids), we fallback to per-item add with try/except
-            for id_, doc, meta in zip(ids, docs, metas):
-                try:
-                    self.collection.add(documents=[doc], metadatas=[meta], ids=[id_])
-                except Exception:
-                    # ignore failures for existing entries
-                    continue
+    def bulk_add_from_file(self, json_path: Path) -> None:
+        """Backwards-compatible alias for `sync_from_file`."""
+        self.sync_from_file(json_path)
 
     # ------------------------------------------------------------------ #
-    def add_message(self, session_id: str, role: str, text: str) -> None:
-        """Add a single chat message to the collection. Generates an id using session and next index."""
-        # Determine next index by counting messages for session (simple approach)
-        try:
-            current_count = self.collection.count()
-        except Exception:
-            current_count = 0
+    @staticmethod
+    def _message_id(text: str) -> str:
+        return "chat-" + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
 
-        # Use high-entropy id to avoid accidental collisions
-        # But prefer sequential ids within session if possible
-        # We attempt to compute next idx by scanning existing metadata hits (best-effort)
-        next_idx = 0
-        # Fetch a small sample (if supported) to compute max idx for session
-        try:
-            results = self.collection.query(query_texts=[text], n_results=1, include=["metadatas"])  # cheap query
-            # ignore result; next_idx fallback to current_count
-        except Exception:
-            pass
+    def add_message(self, session_id: str, role: str, text: str, idx: Optional[int] = None) -> None:
+        """Queue a chat message for indexing; it becomes searchable after the next flush."""
+        text = (text or "").strip()
+        if not text:
+            return
+        meta: Dict[str, Any] = {"session_id": session_id, "role": role}
+        if idx is not None:
+            meta["idx"] = idx
+        with self._pending_cond:
+            self._pending.append({"content": text, "metadata": meta})
+            self._ensure_writer()
+            if len(self._pending) >= CHAT_INDEX_BATCH_SIZE:
+                self._pending_cond.notify()
 
-        doc_id = f"{session_id}::{next_idx}::{os.urandom(4).hex()}"
-        try:
-            self.collection.add(documents=[text], metadatas=[{"session_id": session_id, "role": role}], ids=[doc_id])
-        except Exception:
-            # last resort: try without id
+    def _ensure_writer(self) -> None:
+        """Start the background writer on first use; caller holds `_pending_cond`."""
+        if self._writer is None and not self._closed:
+            self._writer = threading.Thread(target=self._writer_loop, name="chat-index-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _writer_loop(self) -> None:
+        while True:
+            with self._pending_cond:
+                if self._flush_failed and not self._closed:
+                    self._pending_cond.wait(timeout=CHAT_INDEX_FLUSH_INTERVAL)
+                else:
+                    self._pending_cond.wait_for(
+                        lambda: self._closed or len(self._pending) >= CHAT_INDEX_BATCH_SIZE,
+                        timeout=CHAT_INDEX_FLUSH_INTERVAL,
+                    )
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self) -> int:
+        """Embed and store every queued message now. Returns how many were written.
+
+        If the write fails the batch goes back to the front of the queue, so
+        the next flush retries it.
+        """
+        with self._flush_lock:
+            with self._pending_cond:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
             try:
-                self.collection.add(documents=[text], metadatas=[{"session_id": session_id, "role": role}])
+                written = self._write_messages(batch)
             except Exception:
-                pass
+                with self._pending_cond:
+                    self._pending[:0] = batch
+                    self._flush_failed = True
+                return 0
+            self._flush_failed = False
+            self._advance_marks(batch)
+            self._save_state()
+            return written
+
+    def _write_messages(self, items: List[Dict[str, Any]]) -> int:
+        """Store messages keyed by content hash, skipping texts already indexed."""
+        ids: List[str] = []
+        docs: List[str] = []
+        metas: List[Dict[str, Any]] = []
+        for item in items:
+            doc_id = self._message_id(item["content"])
+            if doc_id in self._indexed_ids or doc_id in ids:
+                continue
+            ids.append(doc_id)
+            docs.append(item["content"])
+            metas.append(item["metadata"])
+        if not ids:
+            return 0
+
+        existing = set(self.collection.get(ids=ids, include=[]).get("ids", []))
+        self._indexed_ids.update(existing)
+        keep = [i for i, doc_id in enumerate(ids) if doc_id not in existing]
+        if not keep:
+            return 0
+        ids = [ids[i] for i in keep]
+        docs = [docs[i] for i in keep]
+        metas = [metas[i] for i in keep]
+        self.collection.add(ids=ids, documents=docs, metadatas=metas, embeddings=embed_documents(docs))
+        self._indexed_ids.update(ids)
+        return len(ids)
+
+    def close(self) -> None:
+        """Stop the writer after flushing queued messages (registered with atexit)."""
+        with self._pending_cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending_cond.notify_all()
+            writer = self._writer
+        if writer is not None and writer is not threading.current_thread():
+            writer.join(timeout=30)
+        self.flush()
 
     # ------------------------------------------------------------------ #
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Search chat history for relevant messages. Returns list of dicts with content, metadata, score."""
+    def _similarity(self, dist: float) -> float:
+        """Cosine similarity for a Chroma distance, so retriever thresholds apply as-is."""
+        dist = float(dist)
+        if self.space == "l2":
+            # Squared L2 between unit vectors is 2 - 2*cos
+            return max(0.0, 1 - dist / 2)
+        return max(0.0, 1 - dist)
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Search chat history for relevant messages. Returns list of dicts with content, metadata, score.
+
+        Pass `query_embedding` to reuse an embedding computed by the caller.
+        """
         if not query or not query.strip():
             return []
         try:
+            if query_embedding is None:
+                query_embedding = self.query_embedder([query])[0]
             results = self.collection.query(
-                query_texts=[query],
+                query_embeddings=[[float(x) for x in query_embedding]],
                 n_results=top_k,
                 include=["documents", "metadatas", "distances"],
             )
@@ -161,16 +328,18 @@ class ChatHistoryStore:
 
         hits: List[Dict[str, Any]] = []
         for doc, meta, dist in zip(docs, metas, dists):
-            hits.append({"content": doc, "metadata": meta, "score": max(0.0, 1 - float(dist))})
+            hits.append({"content": doc, "metadata": meta, "score": self._similarity(dist)})
         return hits
 
 
 # Simple convenience function for other modules
 _store: Optional[ChatHistoryStore] = None
+_store_lock = threading.Lock()
 
 
 def get_chat_history_store() -> ChatHistoryStore:
     global _store
-    if _store is None:
-        _store = ChatHistoryStore()
+    with _store_lock:
+        if _store is None:
+            _store = ChatHistoryStore()
     return _store
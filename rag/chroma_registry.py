@@ -0,0 +1,130 @@
+"""
+rag/chroma_registry.py
+Process-wide registry for Chroma clients, collections and embedding functions.
+
+Every vector store in the app (legal corpus, chat history, uploads) goes
+through here so a process holds one client per persist directory and a single
+ONNX embedding model, created lazily on first use and shared across threads.
+chromadb itself is imported on first use too, so importing the rag package
+stays cheap for processes that never touch a vector store.
+Query-time embedding goes through a micro-batcher over that model so
+concurrent requests share model calls (see rag.embedding_batcher). With
+EMBED_SERVER_SOCKET set, embeddings are computed by the shared embedding
+server (rag.embedding_server) instead, and this process never loads the model.
+"""
+
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from config import EMBED_SERVER_SOCKET
+from .embedding_batcher import MicroBatchingEmbedder
+from .embedding_cache import cached_embed
+from .embedding_server import RemoteEmbeddingFunction
+
+# Cache key for vectors produced by DefaultEmbeddingFunction
+DEFAULT_EMBED_MODEL_ID = "chroma-default-all-MiniLM-L6-v2"
+
+_LOCK = threading.RLock()
+_CLIENTS: Dict[str, Any] = {}
+_COLLECTIONS: Dict[Tuple[str, str], Any] = {}
+_EMBEDDING_FN: Optional[Any] = None
+_MODEL_EMBEDDER: Optional[Any] = None
+_QUERY_EMBEDDER: Optional[MicroBatchingEmbedder] = None
+
+
+def _key(persist_dir: Path | str) -> str:
+    return str(Path(persist_dir).resolve())
+
+
+def get_embedding_function():
+    """Return the shared DefaultEmbeddingFunction (loads the ONNX model once)."""
+    global _EMBEDDING_FN
+    with _LOCK:
+        if _EMBEDDING_FN is None:
+            from chromadb.utils import embedding_functions
+
+            _EMBEDDING_FN = embedding_functions.DefaultEmbeddingFunction()
+        return _EMBEDDING_FN
+
+
+def get_model_embedder():
+    """Return the function that actually runs the default model.
+
+    That is the embedding server's client when EMBED_SERVER_SOCKET is set
+    (falling back to the local model if the server is unreachable), else the
+    local DefaultEmbeddingFunction. Collections stay bound to the latter, which
+    only loads its model when called.
+    """
+    global _MODEL_EMBEDDER
+    with _LOCK:
+        if _MODEL_EMBEDDER is None:
+            if EMBED_SERVER_SOCKET:
+                _MODEL_EMBEDDER = RemoteEmbeddingFunction(EMBED_SERVER_SOCKET, fallback=get_embedding_function())
+            else:
+                _MODEL_EMBEDDER = get_embedding_function()
+        return _MODEL_EMBEDDER
+
+
+def embed_documents(texts: Sequence[str]) -> List[List[float]]:
+    """Embed documents for storage, reusing vectors from the on-disk embedding cache."""
+    return cached_embed(texts, get_model_embedder(), DEFAULT_EMBED_MODEL_ID)
+
+
+def get_query_embedder() -> MicroBatchingEmbedder:
+    """Return the shared micro-batching embedder used for query embeddings."""
+    global _QUERY_EMBEDDER
+    with _LOCK:
+        if _QUERY_EMBEDDER is None:
+            _QUERY_EMBEDDER = MicroBatchingEmbedder(get_model_embedder())
+        return _QUERY_EMBEDDER
+
+
+def get_client(persist_dir: Path | str):
+    """Return the shared client for `persist_dir`, creating the directory if needed."""
+    key = _key(persist_dir)
+    with _LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            import chromadb
+
+            Path(key).mkdir(parents=True, exist_ok=True)
+            # Use PersistentClient if available; chroma has multiple client implementations
+            try:
+                client = chromadb.PersistentClient(path=key)
+            except Exception:
+                # fallback to regular client for environments without PersistentClient
+                client = chromadb.Client()
+            _CLIENTS[key] = client
+        return client
+
+
+def distance_space(collection) -> str:
+    """HNSW distance of `collection`: "cosine", "ip" or "l2" (Chroma's default).
+
+    The space is fixed when a collection is created; metadata passed when
+    opening an existing one is ignored, so read it back from the collection.
+    """
+    try:
+        space = ((collection.configuration or {}).get("hnsw") or {}).get("space")
+    except Exception:
+        space = None
+    if not space:
+        space = (collection.metadata or {}).get("hnsw:space")
+    return str(space or "l2")
+
+
+def get_collection(persist_dir: Path | str, name: str, metadata: Optional[Dict[str, Any]] = None):
+    """Return the shared collection `name` in `persist_dir`, bound to the shared embedding function."""
+    key = (_key(persist_dir), name)
+    with _LOCK:
+        collection = _COLLECTIONS.get(key)
+        if collection is None:
+            kwargs: Dict[str, Any] = {"name": name, "embedding_function": get_embedding_function()}
+            if metadata:
+                kwargs["metadata"] = metadata
+            collection = get_client(persist_dir).get_or_create_collection(**kwargs)
+            _COLLECTIONS[key] = collection
+        return collection
@@ -0,0 +1,145 @@
+"""
+rag/context_builder.py
+Pack retrieved hits into a token-budgeted prompt context.
+
+Hits from the same source are merged when they are adjacent chunks or share
+overlapping text (the chunker overlaps neighbours by 150 characters), repeated
+spans are dropped, and the merged passages are added by score until the token
+budget is spent. Passages that do not fit whole are cut at a sentence boundary
+rather than mid-sentence.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import CONTEXT_TOKEN_BUDGET
+
+# Rough chars-per-token ratio for English legal text with LLaMA-style tokenizers
+_CHARS_PER_TOKEN = 4
+# Overlaps shorter than this are treated as coincidence, not shared text
+_MIN_OVERLAP = 20
+# Passages left with fewer tokens than this are not worth including
+_MIN_PASSAGE_TOKENS = 40
+
+_SENTENCE_END_RE = re.compile(r"[.;:!?](?=\s)|\n")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if below _MIN_OVERLAP)."""
+    if len(a) < _MIN_OVERLAP or len(b) < _MIN_OVERLAP:
+        return 0
+    probe = b[:_MIN_OVERLAP]
+    start = max(0, len(a) - len(b))
+    pos = a.find(probe, start)
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+
+def _join(a: str, b: str) -> str:
+    """Concatenate two passages, collapsing shared text and repeated spans."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    k = _overlap(a, b)
+    if k:
+        return a + b[k:]
+    return f"{a}\n{b}"
+
+
+def _trim_to_sentence(text: str, max_tokens: int) -> str:
+    """Cut `text` to roughly `max_tokens`, ending on a sentence boundary when possible."""
+    limit = max_tokens * _CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    head = text[:limit]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(head)]
+    if ends and ends[-1] >= limit // 2:
+        return head[: ends[-1]].rstrip()
+    return head.rstrip() + " …"
+
+
+def _group_key(hit: Any) -> Optional[str]:
+    meta = getattr(hit, "metadata", None) or {}
+    source = meta.get("source")
+    if not source:
+        return None
+    return f"{source}\x00{meta.get('session_id', '')}"
+
+
+def merge_hits(hits: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Merge hits from the same source into passages.
+
+    Returns passages as {title, content, score, metadata}; a passage's score
+    is the best score of the hits it absorbed.
+    """
+    passages: List[Dict[str, Any]] = []
+    by_source: Dict[str, List[Any]] = {}
+    for hit in hits:
+        key = _group_key(hit)
+        if key is None:
+            passages.append({"title": hit.title, "content": hit.content, "score": hit.score, "metadata": dict(hit.metadata or {})})
+        else:
+            by_source.setdefault(key, []).append(hit)
+
+    for group in by_source.values():
+        group = sorted(group, key=lambda h: (h.metadata or {}).get("chunk_id", 0))
+        current: Optional[Dict[str, Any]] = None
+        last_chunk: Optional[int] = None
+        for hit in group:
+            chunk_id = (hit.metadata or {}).get("chunk_id")
+            adjacent = (
+                current is not None
+                and last_chunk is not None
+                and chunk_id is not None
+                and chunk_id - last_chunk <= 1
+            )
+            if current is not None and (adjacent or _overlap(current["content"], hit.content) or hit.content in current["content"]):
+                current["content"] = _join(current["content"], hit.content)
+                current["score"] = max(current["score"], hit.score)
+            else:
+                current = {"title": hit.title, "content": hit.content, "score": hit.score, "metadata": dict(hit.metadata or {})}
+                passages.append(current)
+            last_chunk = chunk_id
+
+    # Drop passages whose text is already contained in a better-scoring one
+    passages.sort(key=lambda p: p["score"], reverse=True)
+    unique: List[Dict[str, Any]] = []
+    for p in passages:
+        text = (p["content"] or "").strip()
+        if not text or any(text in u["content"] for u in unique):
+            continue
+        unique.append(p)
+    return unique
+
+
+def pack_context(hits: Sequence[Any], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Dict[str, Any]]:
+    """Merge `hits` and fill `token_budget` with the best passages.
+
+    Each returned passage carries `snippet`, the (possibly sentence-trimmed)
+    text to place in the prompt.
+    """
+    packed: List[Dict[str, Any]] = []
+    remaining = token_budget
+    for passage in merge_hits(hits):
+        # The title line is sent with every passage, so it counts against the budget
+        available = remaining - estimate_tokens(passage["title"] or "")
+        if available < _MIN_PASSAGE_TOKENS:
+            continue
+        snippet = _trim_to_sentence(passage["content"], available)
+        if estimate_tokens(snippet) < _MIN_PASSAGE_TOKENS and snippet != passage["content"]:
+            continue
+        packed.append({**passage, "snippet": snippet})
+        remaining = available - estimate_tokens(snippet)
+        if remaining < _MIN_PASSAGE_TOKENS:
+            break
+    return packed
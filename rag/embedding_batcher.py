@@ -0,0 +1,83 @@
+"""
+rag/embedding_batcher.py
+Cross-thread micro-batching for query embeddings.
+
+Request threads each embed one short query; run one at a time, the ONNX
+session sees many single-item batches. MicroBatchingEmbedder queues those
+calls, and a single worker thread collects them for up to
+EMBED_BATCH_WINDOW_MS (or until EMBED_BATCH_MAX texts are waiting), embeds
+them in one model call and hands each caller its own rows back.
+
+Calls that already carry a full batch (ingestion, seeding) skip the queue and
+go straight to the model.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Sequence, Tuple
+
+from config import EMBED_BATCH_MAX, EMBED_BATCH_WINDOW_MS
+
+
+class MicroBatchingEmbedder:
+    """Callable with the embedding-function signature: `embedder(texts) -> embeddings`."""
+
+    def __init__(self, embedding_fn, window_ms: float = EMBED_BATCH_WINDOW_MS, max_batch: int = EMBED_BATCH_MAX) -> None:
+        self.embedding_fn = embedding_fn
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._worker.start()
+        # Counters for diagnostics: model calls made vs. texts embedded through the queue
+        self.batches = 0
+        self.batched_texts = 0
+
+    def __call__(self, input: Sequence[str]) -> List[Any]:
+        texts = list(input)
+        if not texts:
+            return []
+        if len(texts) >= self.max_batch or not self.window:
+            return list(self.embedding_fn(texts))
+        future: Future = Future()
+        self._queue.put((texts, future))
+        return future.result()
+
+    # ------------------------------------------------------------------ #
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        """Block for the first request, then gather more until the window closes or the batch is full."""
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            texts = [text for batch, _ in pending for text in batch]
+            try:
+                embeddings = list(self.embedding_fn(texts))
+            except Exception as exc:
+                for _, future in pending:
+                    future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.batched_texts += len(texts)
+            offset = 0
+            for batch, future in pending:
+                future.set_result(embeddings[offset : offset + len(batch)])
+                offset += len(batch)
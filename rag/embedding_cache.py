@@ -0,0 +1,208 @@
+"""
+rag/embedding_cache.py
+Persistent embedding cache keyed by (model id, text hash).
+
+Re-seeding the corpus, rebuilding the chat-history collection, re-running
+data/build_law_chromadb.py or re-uploading a PDF all embed text the model has
+already seen. Ingestion paths call `EmbeddingCache.embed`, which serves known
+texts from disk and only runs the model on the rest.
+
+On disk, under EMBED_CACHE_DIR, each model gets:
+  - {model}.f32    row-major float32 vectors (memory-mapped for reads)
+  - {model}.keys   16-byte text digests, one per row, in the same order
+  - {model}.json   {model_id, dim}
+Both data files are append-only; a row counts once its digest is written.
+Appends hold an exclusive flock on the keys file and pick up rows other
+processes (workers, the embedding server) added first, so concurrent writers
+never reuse the same offsets.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+from config import EMBED_CACHE_DIR, EMBED_CACHE_ENABLED
+
+_DIGEST_BYTES = 16
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:_DIGEST_BYTES]
+
+
+class EmbeddingCache:
+    def __init__(self, directory: Path, model_id: str) -> None:
+        self.model_id = model_id
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stem = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        self.vectors_path = self.directory / f"{stem}.f32"
+        self.keys_path = self.directory / f"{stem}.keys"
+        self.meta_path = self.directory / f"{stem}.json"
+        self._lock = threading.Lock()
+        self.dim: Optional[int] = None
+        self._row_of: Dict[bytes, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    def _read_meta(self) -> None:
+        try:
+            with self.meta_path.open("r", encoding="utf-8") as fh:
+                self.dim = int(json.load(fh)["dim"])
+        except (OSError, ValueError, KeyError, json.JSONDecodeError):
+            self.dim = None
+
+    def _disk_rows(self, key_bytes: int) -> int:
+        vector_rows = self.vectors_path.stat().st_size // (self.dim * 4) if self.vectors_path.exists() else 0
+        # Ignore a digest whose vector was cut short by an interrupted write
+        return min(key_bytes // _DIGEST_BYTES, vector_rows)
+
+    def _load(self) -> None:
+        self._read_meta()
+        if self.dim is None:
+            return
+        keys = self.keys_path.read_bytes() if self.keys_path.exists() else b""
+        rows = self._disk_rows(len(keys))
+        for row in range(rows):
+            self._row_of[keys[row * _DIGEST_BYTES : (row + 1) * _DIGEST_BYTES]] = row
+        self._remap(rows)
+
+    def _sync_from_disk(self, kf: BinaryIO) -> int:
+        """Map rows appended by other processes; returns the row count on disk.
+
+        Caller holds both locks and `kf` is the open keys file.
+        """
+        kf.seek(0, 2)
+        rows = self._disk_rows(kf.tell())
+        known = len(self._row_of)
+        if rows < known:
+            # Files were reset (e.g. re-created by another process); start over
+            self._row_of, known = {}, 0
+        if rows > known:
+            kf.seek(known * _DIGEST_BYTES)
+            keys = kf.read((rows - known) * _DIGEST_BYTES)
+            for offset in range(rows - known):
+                self._row_of[keys[offset * _DIGEST_BYTES : (offset + 1) * _DIGEST_BYTES]] = known + offset
+        return rows
+
+    def _remap(self, rows: int) -> None:
+        if rows and self.dim:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+        else:
+            self._matrix = None
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # ------------------------------------------------------------------ #
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the cached embedding for each text, or None where it is not cached."""
+        with self._lock:
+            matrix, row_of = self._matrix, self._row_of
+            out: List[Optional[List[float]]] = []
+            for text in texts:
+                row = row_of.get(_digest(text))
+                out.append(None if row is None or matrix is None else matrix[row].tolist())
+            return out
+
+    def put_many(self, texts: Sequence[str], embeddings: Sequence[Sequence[float]]) -> None:
+        """Append embeddings for texts not already cached."""
+        if not texts:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self.keys_path.touch(exist_ok=True)
+            with open(self.keys_path, "r+b") as kf:
+                if fcntl is not None:
+                    # Released when the file is closed
+                    fcntl.flock(kf.fileno(), fcntl.LOCK_EX)
+                self._append(kf, texts, vectors)
+
+    def _append(self, kf: BinaryIO, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Append rows for uncached texts; caller holds both locks."""
+        if self.dim is None:
+            # Another process may have created the cache since we loaded
+            self._read_meta()
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with self.meta_path.open("w", encoding="utf-8") as fh:
+                json.dump({"model_id": self.model_id, "dim": self.dim}, fh)
+            # Any data files left without metadata belong to no known layout
+            self.vectors_path.write_bytes(b"")
+            kf.truncate(0)
+            self._row_of = {}
+        if vectors.shape[1] != self.dim:
+            return
+        start = self._sync_from_disk(kf)
+        new_rows, new_keys = [], []
+        pending = set()
+        for text, vec in zip(texts, vectors):
+            key = _digest(text)
+            if key in self._row_of or key in pending:
+                continue
+            pending.add(key)
+            new_rows.append(vec)
+            new_keys.append(key)
+        if new_rows:
+            # Vectors first, then digests: a crash in between leaves only unreferenced rows
+            with open(self.vectors_path, "r+b" if self.vectors_path.exists() else "w+b") as vf:
+                vf.seek(start * self.dim * 4)
+                vf.write(np.stack(new_rows).tobytes())
+            kf.seek(start * _DIGEST_BYTES)
+            kf.write(b"".join(new_keys))
+            kf.flush()
+            for offset, key in enumerate(new_keys):
+                self._row_of[key] = start + offset
+        self._remap(len(self._row_of))
+
+    def embed(self, texts: Sequence[str], embed_fn: Callable[[List[str]], Any]) -> List[List[float]]:
+        """Embed `texts`, calling `embed_fn` only for texts missing from the cache."""
+        texts = list(texts)
+        cached = self.get_many(texts)
+        missing = list(dict.fromkeys(t for t, emb in zip(texts, cached) if emb is None))
+        self.hits += len(texts) - sum(1 for emb in cached if emb is None)
+        self.misses += len(missing)
+        if missing:
+            fresh = [[float(x) for x in emb] for emb in embed_fn(missing)]
+            self.put_many(missing, fresh)
+            by_text = dict(zip(missing, fresh))
+            cached = [emb if emb is not None else by_text[t] for t, emb in zip(texts, cached)]
+        return cached
+
+
+_CACHES: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_id: str) -> EmbeddingCache:
+    """Return the shared cache for `model_id` under EMBED_CACHE_DIR."""
+    with _caches_lock:
+        cache = _CACHES.get(model_id)
+        if cache is None:
+            cache = EmbeddingCache(Path(EMBED_CACHE_DIR), model_id)
+            _CACHES[model_id] = cache
+        return cache
+
+
+def cached_embed(texts: Sequence[str], embed_fn: Callable[[List[str]], Any], model_id: str) -> List[List[float]]:
+    """Embed through the on-disk cache for `model_id` (or directly when EMBED_CACHE_ENABLED is off)."""
+    if not texts:
+        return []
+    if not EMBED_CACHE_ENABLED:
+        return [[float(x) for x in emb] for emb in embed_fn(list(texts))]
+    return get_embedding_cache(model_id).embed(texts, embed_fn)
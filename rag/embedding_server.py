@@ -0,0 +1,216 @@
+"""
+rag/embedding_server.py
+Optional local embedding server shared by worker processes.
+
+Each worker process would otherwise load its own ONNX MiniLM (and bge-large
+for ingestion). Run one server instead:
+
+    python -m rag.embedding_server --socket /tmp/lexigpt-embed.sock
+
+and set EMBED_SERVER_SOCKET to the same path in the workers. The server owns
+one instance of each model and feeds every connection through a
+MicroBatchingEmbedder, so concurrent requests from all processes and threads
+are embedded together. Workers talk to it through RemoteEmbeddingFunction, a
+drop-in embedding function (`fn(texts) -> embeddings`).
+
+Wire format (both directions): 8-byte header `!II` (JSON length, payload
+length), a JSON object, then a binary payload.
+  request:  {"model": id, "texts": [...]}                  (empty payload)
+  response: {"n": rows, "dim": d} + float32 row-major vectors, or {"error": msg}
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import EMBED_BATCH_MAX, EMBED_BATCH_WINDOW_MS, EMBED_SERVER_SOCKET
+from .embedding_batcher import MicroBatchingEmbedder
+
+# Model id for Chroma's DefaultEmbeddingFunction (all-MiniLM-L6-v2, ONNX)
+DEFAULT_MODEL = "default"
+
+_HEADER = struct.Struct("!II")
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding server connection closed")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _send_msg(sock: socket.socket, header: Dict[str, Any], payload: bytes = b"") -> None:
+    raw = json.dumps(header).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(raw), len(payload)) + raw + payload)
+
+
+def _recv_msg(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    header_len, payload_len = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    header = json.loads(_recv_exact(sock, header_len).decode("utf-8"))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    return header, payload
+
+
+# ---------------------------------------------------------------------- #
+# Server
+# ---------------------------------------------------------------------- #
+def _load_model(model_id: str) -> Callable[[List[str]], Any]:
+    if model_id == DEFAULT_MODEL:
+        from chromadb.utils import embedding_functions
+
+        return embedding_functions.DefaultEmbeddingFunction()
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_id)
+    return lambda texts: model.encode(texts)
+
+
+class _ModelPool:
+    """One batched embedder per model id, loaded on first request."""
+
+    def __init__(self, loader: Callable[[str], Callable[[List[str]], Any]] = _load_model) -> None:
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._embedders: Dict[str, MicroBatchingEmbedder] = {}
+
+    def get(self, model_id: str) -> MicroBatchingEmbedder:
+        with self._lock:
+            embedder = self._embedders.get(model_id)
+            if embedder is None:
+                embedder = MicroBatchingEmbedder(self.loader(model_id), EMBED_BATCH_WINDOW_MS, EMBED_BATCH_MAX)
+                self._embedders[model_id] = embedder
+            return embedder
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        # One connection carries many requests; workers keep theirs open
+        while True:
+            try:
+                header, _ = _recv_msg(self.request)
+            except (ConnectionError, OSError, struct.error, json.JSONDecodeError):
+                return
+            try:
+                embedder = self.server.models.get(header.get("model") or DEFAULT_MODEL)
+                vectors = np.asarray(embedder(list(header.get("texts") or [])), dtype=np.float32)
+                if vectors.ndim != 2:
+                    vectors = vectors.reshape(len(vectors), -1)
+                _send_msg(self.request, {"n": int(vectors.shape[0]), "dim": int(vectors.shape[1])}, vectors.tobytes())
+            except (ConnectionError, BrokenPipeError):
+                return
+            except Exception as exc:
+                try:
+                    _send_msg(self.request, {"error": str(exc)})
+                except OSError:
+                    return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Unix sockets refuse connects (EAGAIN) once the backlog is full; workers connect in bursts
+    request_queue_size = 256
+
+    def __init__(self, socket_path: str, loader: Optional[Callable[[str], Callable[[List[str]], Any]]] = None) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self.models = _ModelPool(loader or _load_model)
+        super().__init__(socket_path, _Handler)
+
+
+# ---------------------------------------------------------------------- #
+# Client
+# ---------------------------------------------------------------------- #
+class RemoteEmbeddingFunction:
+    """Embedding function backed by the embedding server.
+
+    Keeps one connection per thread and reconnects once if it was dropped.
+    If the server cannot be reached and `fallback` is given, texts are
+    embedded locally with it instead.
+    """
+
+    def __init__(
+        self,
+        socket_path: str = EMBED_SERVER_SOCKET,
+        model: str = DEFAULT_MODEL,
+        fallback: Optional[Callable[[List[str]], Any]] = None,
+        timeout: float = 120.0,
+    ) -> None:
+        self.socket_path = socket_path
+        self.model = model
+        self.fallback = fallback
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self._local.sock = sock
+        return sock
+
+    def _close(self) -> None:
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, texts: List[str]) -> List[np.ndarray]:
+        sock = getattr(self._local, "sock", None) or self._connect()
+        _send_msg(sock, {"model": self.model, "texts": texts})
+        header, payload = _recv_msg(sock)
+        if "error" in header:
+            raise RuntimeError(f"embedding server: {header['error']}")
+        vectors = np.frombuffer(payload, dtype=np.float32).reshape(header["n"], header["dim"])
+        return list(vectors)
+
+    def __call__(self, input: Sequence[str]) -> List[np.ndarray]:
+        texts = list(input)
+        if not texts:
+            return []
+        for attempt in range(2):
+            try:
+                return self._request(texts)
+            except (ConnectionError, OSError):
+                # Stale connection (server restarted) gets one reconnect
+                self._close()
+                if attempt:
+                    if self.fallback is None:
+                        raise
+        return list(self.fallback(texts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve embeddings to LexiGPT workers over a Unix socket.")
+    parser.add_argument("--socket", default=EMBED_SERVER_SOCKET or "/tmp/lexigpt-embed.sock")
+    parser.add_argument("--preload", action="append", default=[], help="model id to load at start (repeatable)")
+    args = parser.parse_args()
+
+    server = EmbeddingServer(args.socket)
+    for model_id in args.preload:
+        server.models.get(model_id)
+    print(f"Embedding server listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,59 @@
 """
 rag/rag_pipeline.py
 RAG pipeline helpers shared by the Flask routes and services.
+
+The shared Retriever (and with it chromadb) is created on first use, not at import.
 """
 
 from __future__ import annotations
 
-from typing import List, Dict
-
-from .retriever import Retriever, RetrieverResult
-
-_RETRIEVER = Retriever()
+from typing import List, Dict, Optional
 
+from config import CONTEXT_TOKEN_BUDGET
+from .context_builder import pack_context
+from .retriever import RetrieverResult, get_retriever
 
-def get_relevant_context(query: str, top_k: int = 3, session_id: str | None = None) -> List[Dict]:
+def get_relevant_context(
+    query: str,
+    top_k: int = 3,
+    session_id: str | None = None,
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+) -> List[Dict]:
     """Return structured context snippets for the given query.
 
     Each entry is a dict containing: id (int), title, content, score, snippet.
+    Hits are merged (adjacent/overlapping chunks of one source become one
+    passage) and packed into `token_budget`; `snippet` is the prompt text,
+    trimmed at a sentence boundary if it had to be shortened.
     """
-    hits: List[RetrieverResult] = _RETRIEVER.search(query, top_k=top_k, session_id=session_id)
+    hits: List[RetrieverResult] = get_retriever().search(query, top_k=top_k, session_id=session_id)
     results: List[Dict] = []
-    for idx, hit in enumerate(hits, start=1):
-        # Create a short snippet from the content for prompting and display
-        snippet = hit.content[:400]
+    for idx, passage in enumerate(pack_context(hits, token_budget=token_budget), start=1):
         results.append({
             "id": idx,
-            "title": hit.title,
-            "content": hit.content,
-            "score": hit.score,
-            "snippet": snippet,
+            "title": passage["title"],
+            "content": passage["content"],
+            "score": passage["score"],
+            "snippet": passage["snippet"],
         })
     return results
+
+
+def embed_query(query: str) -> Optional[List[float]]:
+    """Embed `query` with the retriever's model (shares its LRU of query embeddings)."""
+    return get_retriever()._embed_query(query)
+
+
+def corpus_version(session_id: str | None = None) -> str:
+    """Version tag of the corpus searched for `session_id`, for invalidating derived caches."""
+    return get_retriever().corpus_version(session_id)
+
+
+def retrieval_status() -> Dict:
+    """Readiness of the retriever: search mode and corpus seeding progress."""
+    return get_retriever().status()
+
+
+def restart_seeding() -> bool:
+    """Start corpus seeding again after it failed. Returns True if a new run started."""
+    return get_retriever().start_seeding()
@@ -2,18 +2,56 @@
 """
 Retrieval layer for RAG
 -----------------------
-Provides a thin wrapper around the VectorDB along with a keyword fallback.
+Provides a thin wrapper around the VectorDB, a BM25 lexical index fused in
+with reciprocal-rank fusion, and a keyword fallback. Session-scoped searches
+also query the session's upload partition (see rag.session_partitions).
+
+The vector corpus is seeded from combined.json in a background thread; until
+it is complete, searches are served from BM25 and chat history only.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List
+from typing import Any, Callable, Dict, List, Optional
 
-from config import LEGAL_DATA_FILE, VECTOR_DB_DIR
+from config import (
+    LEGAL_DATA_FILE,
+    QUERY_EMBED_CACHE_SIZE,
+    RETRIEVER_CONCURRENT,
+    RRF_K,
+    RETRIEVER_MAX_WORKERS,
+    RETRIEVER_MIN_SCORE,
+    RETRIEVER_SOURCE_TIMEOUT,
+    SEED_IN_BACKGROUND,
+    VECTOR_DB_DIR,
+)
+from .bm25_index import BM25Index, get_bm25_index
 from .vector_db import VectorDB
 from .chat_history_store import get_chat_history_store
+from .session_partitions import get_session_partitions
+
+# Shared pool for fanning a search out across sources (chat, corpus, ...).
+# A call that times out keeps its worker until it returns, so each source is
+# allowed at most one overdue call (see Retriever._run_sources): with more
+# workers than source names, stuck calls can never fill the pool.
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=RETRIEVER_MAX_WORKERS, thread_name_prefix="retriever")
+
+# Per-source weights for reciprocal-rank fusion; chat matches get a slight boost
+_SOURCE_WEIGHTS = {"chat": 1.2, "corpus": 1.0, "bm25": 1.0, "session": 1.0, "session_bm25": 1.0}
+# Sources whose scores are cosine similarities; weak matches are dropped before
+# fusion, since RRF alone would rank an unrelated top hit as highly as a good one
+_SIMILARITY_SOURCES = {"chat", "corpus", "session"}
+
+# Corpus seeding is retried this many times, waiting _SEED_BACKOFF seconds
+# (doubled each time) in between; seed() resumes where the last attempt stopped
+_SEED_ATTEMPTS = 4
+_SEED_BACKOFF = 5.0
 
 
 @dataclass
@@ -21,6 +59,17 @@ class RetrieverResult:
     title: str
     content: str
     score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_hit(cls, hit: Dict[str, Any]) -> "RetrieverResult":
+        """Build a result from a VectorDB/BM25 hit dict."""
+        return cls(
+            title=hit.get("title", "Legal Reference"),
+            content=hit.get("content", ""),
+            score=float(hit.get("score", 0.0)),
+            metadata=dict(hit.get("metadata") or {}),
+        )
 
     def as_text(self) -> str:
         return f"{self.title}\n{self.content}"
@@ -31,15 +80,44 @@ class Retriever:
         data_path = Path(LEGAL_DATA_FILE)
         persist_dir = Path(VECTOR_DB_DIR)
 
+        # Lexical index is independent of Chroma so it still serves if the vector DB is down
         try:
-            self.vdb = VectorDB(persist_dir=persist_dir, auto_seed_file=data_path)
+            self.bm25 = get_bm25_index()
+        except Exception:
+            self.bm25 = None
+        try:
+            self.vdb = VectorDB(persist_dir=persist_dir, lexical_index=self.bm25)
         except Exception:
             self.vdb = None
+        # The corpus collection joins searches once seeding has finished
+        self._vector_ready = threading.Event()
+        self._seed_lock = threading.Lock()
+        self.seed_status: Dict[str, Any] = {"state": "pending", "done": 0, "total": 0, "error": None}
         # Initialize chat history store
         try:
             self.chat_store = get_chat_history_store()
         except Exception:
             self.chat_store = None
+        # Session uploads are searched in their own partitions, not via where-filters
+        self.partitions = get_session_partitions()
+
+        # Bounded LRU of query embeddings keyed by normalised query text
+        self._embed_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embed_cache_size = max(0, QUERY_EMBED_CACHE_SIZE)
+        self._embed_lock = threading.Lock()
+
+        # Sources with a timed-out call still running; skipped until it returns
+        self._overdue: set = set()
+        self._overdue_lock = threading.Lock()
+
+        self.data_path = data_path
+        if self.vdb:
+            if SEED_IN_BACKGROUND:
+                self.start_seeding()
+            else:
+                self._seed(data_path)
+        else:
+            self.seed_status["state"] = "unavailable"
 
         self.fallback_corpus: List[Dict[str, str]] = [
             {
@@ -57,44 +135,165 @@ class Retriever:
         ]
 
     # ------------------------------------------------------------------ #
-    def search(self, query: str, top_k: int = 3, session_id: str | None = None) -> List[RetrieverResult]:
-        combined: List[RetrieverResult] = []
+    def start_seeding(self) -> bool:
+        """Start seeding in the background unless it is running or done. Returns True if started."""
+        with self._seed_lock:
+            if not self.vdb or self.seed_status["state"] in ("seeding", "retrying", "ready"):
+                return False
+            self.seed_status.update(state="seeding", error=None)
+        threading.Thread(target=self._seed, args=(self.data_path,), name="corpus-seed", daemon=True).start()
+        return True
 
-        # 1) Search chat history first (gives user-specific context)
-        if getattr(self, "chat_store", None):
+    def _seed(self, data_path: Path) -> None:
+        """Seed the vector corpus from `data_path`, recording progress in `seed_status`.
+
+        Failed attempts are retried with backoff; after the last one the state
+        is "failed" and `start_seeding` can try again.
+        """
+
+        def _progress(done: int, total: int) -> None:
+            with self._seed_lock:
+                self.seed_status.update(done=done, total=total)
+
+        with self._seed_lock:
+            self.seed_status.update(state="seeding", started_at=time.time(), attempts=0)
+        for attempt in range(1, _SEED_ATTEMPTS + 1):
             try:
-                chat_hits = self.chat_store.search(query, top_k=top_k)
-                for hit in chat_hits:
-                    meta = hit.get("metadata", {}) or {}
-                    session_id = meta.get("session_id", "chat")
-                    role = meta.get("role", "user")
-                    title = f"Chat ({session_id} - {role})"
-                    score = float(hit.get("score", 0.0))
-                    # Slightly boost chat matches
-                    score = min(1.0, score * 1.2)
-                    combined.append(RetrieverResult(title=title, content=hit.get("content", ""), score=score))
-            except Exception:
-                pass
+                self.vdb.seed(data_path, progress=_progress)
+                break
+            except Exception as exc:
+                last = attempt == _SEED_ATTEMPTS
+                with self._seed_lock:
+                    self.seed_status.update(
+                        state="failed" if last else "retrying",
+                        attempts=attempt,
+                        error=str(exc),
+                        finished_at=time.time() if last else None,
+                    )
+                if last:
+                    return
+                time.sleep(_SEED_BACKOFF * (2 ** (attempt - 1)))
+        with self._seed_lock:
+            self.seed_status.update(state="ready", error=None, finished_at=time.time())
+        self._vector_ready.set()
 
-        # 2) Search legal corpus
-        if self.vdb:
+    @property
+    def vector_ready(self) -> bool:
+        return self._vector_ready.is_set()
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness snapshot: retrieval mode plus corpus seeding progress."""
+        with self._seed_lock:
+            seeding = dict(self.seed_status)
+        return {
+            "mode": "hybrid" if self.vector_ready else "lexical" if getattr(self, "bm25", None) else "fallback",
+            "vector_ready": self.vector_ready,
+            "seeding": seeding,
+        }
+
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _normalise_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def _embed_query(self, query: str) -> Optional[List[float]]:
+        """Embed `query` once per search, reusing recent embeddings from the LRU.
+
+        Returns None when no embedding function is available; callers then let
+        each collection embed the text itself.
+        """
+        return self._embed_queries([query])[0]
+
+    def _embed_queries(self, queries: List[str]) -> List[Optional[List[float]]]:
+        """Batch variant of `_embed_query`: cache misses are embedded in one call."""
+        out: List[Optional[List[float]]] = [None] * len(queries)
+        if not self.vdb:
+            return out
+        keys = [self._normalise_query(q or "") for q in queries]
+        missing: List[str] = []
+        with self._embed_lock:
+            for i, key in enumerate(keys):
+                if not key:
+                    continue
+                cached = self._embed_cache.get(key)
+                if cached is not None:
+                    self._embed_cache.move_to_end(key)
+                    out[i] = cached
+                elif key not in missing:
+                    missing.append(key)
+        if missing:
             try:
-                # If a session_id is provided, scope the vector DB search to that session
-                where = {"session_id": session_id} if session_id else None
-                hits = self.vdb.search(query, top_k=top_k, where=where)
-                if hits:
-                    for hit in hits:
-                        combined.append(
-                            RetrieverResult(
-                                title=hit.get("title", "Legal Reference"),
-                                content=hit.get("content", ""),
-                                score=float(hit.get("score", 0.0)),
-                            )
-                        )
+                fresh = dict(zip(missing, self.vdb.embed_queries(missing)))
             except Exception:
-                pass
+                fresh = {}
+            for i, key in enumerate(keys):
+                if out[i] is None and key in fresh:
+                    out[i] = fresh[key]
+            if self._embed_cache_size and fresh:
+                with self._embed_lock:
+                    for key, embedding in fresh.items():
+                        self._embed_cache[key] = embedding
+                        self._embed_cache.move_to_end(key)
+                    while len(self._embed_cache) > self._embed_cache_size:
+                        self._embed_cache.popitem(last=False)
+        return out
+
+    def corpus_version(self, session_id: Optional[str] = None) -> str:
+        """Identifier that changes whenever the corpus searched for `session_id` changes."""
+        bm25 = getattr(self, "bm25", None)
+        version = "none" if bm25 is None else f"bm25-{bm25.revision}-{bm25.source_mtime}"
+        if not self.vector_ready:
+            # Answers produced from lexical-only retrieval must not outlive seeding
+            version += "-lexical"
+        try:
+            session_revision = self.partitions.revision(session_id)
+        except Exception:
+            session_revision = None
+        if session_revision is not None:
+            version += f"-session-{session_revision}"
+        # Chat history is searched for every session, so any newly indexed message counts
+        chat_revision = getattr(getattr(self, "chat_store", None), "revision", None)
+        if chat_revision is not None:
+            version += f"-chat-{chat_revision}"
+        return version
+
+    def _partition(self, session_id: Optional[str]) -> Optional[VectorDB]:
+        try:
+            return self.partitions.get(session_id)
+        except Exception:
+            return None
+
+    # ------------------------------------------------------------------ #
+    def _search_chat(self, query: str, top_k: int, query_embedding: Optional[List[float]]) -> List[RetrieverResult]:
+        """Search chat history (gives user-specific context)."""
+        results: List[RetrieverResult] = []
+        chat_hits = self.chat_store.search(query, top_k=top_k, query_embedding=query_embedding)
+        for hit in chat_hits:
+            meta = hit.get("metadata", {}) or {}
+            chat_session = meta.get("session_id", "chat")
+            role = meta.get("role", "user")
+            title = f"Chat ({chat_session} - {role})"
+            score = float(hit.get("score", 0.0))
+            results.append(RetrieverResult(title=title, content=hit.get("content", ""), score=score, metadata=meta))
+        return results
 
-        # Fallback: naive keyword scoring
+    def _search_corpus(
+        self,
+        query: str,
+        top_k: int,
+        query_embedding: Optional[List[float]],
+        vdb: Optional[VectorDB] = None,
+    ) -> List[RetrieverResult]:
+        """Search the shared legal corpus collection, or `vdb` (a session partition) if given."""
+        hits = (vdb or self.vdb).search(query, top_k=top_k, query_embedding=query_embedding)
+        return [RetrieverResult.from_hit(hit) for hit in hits or []]
+
+    def _search_bm25(self, query: str, top_k: int, index: Optional[BM25Index] = None) -> List[RetrieverResult]:
+        """Search the shared BM25 lexical index, or `index` (a session partition's) if given."""
+        return [RetrieverResult.from_hit(hit) for hit in (index or self.bm25).search(query, top_k=top_k)]
+
+    def _keyword_fallback(self, query: str, top_k: int) -> List[RetrieverResult]:
+        """Naive keyword scoring over the built-in fallback corpus."""
         query_tokens = set(query.lower().split())
         scored: List[RetrieverResult] = []
         for entry in self.fallback_corpus:
@@ -102,21 +301,196 @@ class Retriever:
             doc_tokens = set(content.lower().split())
             score = len(query_tokens & doc_tokens)
             scored.append(RetrieverResult(entry["title"], content, float(score)))
+        scored.sort(key=lambda r: r.score, reverse=True)
+        return scored[:top_k]
+
+    def _sources(
+        self,
+        query: str,
+        top_k: int,
+        session_id: Optional[str],
+        query_embedding: Optional[List[float]],
+    ) -> Dict[str, Callable[[], List[RetrieverResult]]]:
+        """Return the retrieval sources to query for this search, keyed by name."""
+        sources: Dict[str, Callable[[], List[RetrieverResult]]] = {}
+        if getattr(self, "chat_store", None):
+            sources["chat"] = lambda: self._search_chat(query, top_k, query_embedding)
+        if self.vdb and self.vector_ready:
+            sources["corpus"] = lambda: self._search_corpus(query, top_k, query_embedding)
+        if getattr(self, "bm25", None):
+            sources["bm25"] = lambda: self._search_bm25(query, top_k)
+        partition = self._partition(session_id)
+        if partition is not None:
+            sources["session"] = lambda: self._search_corpus(query, top_k, query_embedding, vdb=partition)
+            if partition.lexical_index is not None:
+                sources["session_bm25"] = lambda: self._search_bm25(query, top_k, index=partition.lexical_index)
+        return sources
+
+    def _run_sources(
+        self,
+        sources: Dict[str, Callable[[], List[RetrieverResult]]],
+        concurrent: bool,
+    ) -> Dict[str, List[RetrieverResult]]:
+        """Run every source and collect the ranked hits of those that succeed.
+
+        In concurrent mode all sources are submitted to the shared executor at
+        once; any source that misses RETRIEVER_SOURCE_TIMEOUT is dropped and
+        the hits of the others are merged. A running call cannot be cancelled,
+        so a source that timed out is also skipped by later searches until its
+        overdue call returns, rather than queueing more work behind it.
+        """
+        ranked: Dict[str, List[RetrieverResult]] = {}
+        if not concurrent or len(sources) < 2:
+            for name, fn in sources.items():
+                try:
+                    ranked[name] = fn()
+                except Exception:
+                    pass
+            return ranked
+
+        with self._overdue_lock:
+            sources = {name: fn for name, fn in sources.items() if name not in self._overdue}
+        futures = {_SEARCH_EXECUTOR.submit(fn): name for name, fn in sources.items()}
+        done, not_done = wait(futures, timeout=RETRIEVER_SOURCE_TIMEOUT)
+        for future in not_done:
+            if future.cancel():
+                continue
+            name = futures[future]
+            with self._overdue_lock:
+                self._overdue.add(name)
+            future.add_done_callback(lambda _f, name=name: self._clear_overdue(name))
+        for future in done:
+            try:
+                ranked[futures[future]] = future.result()
+            except Exception:
+                pass
+        return ranked
+
+    def _clear_overdue(self, name: str) -> None:
+        with self._overdue_lock:
+            self._overdue.discard(name)
+
+    # ------------------------------------------------------------------ #
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        session_id: str | None = None,
+        concurrent: Optional[bool] = None,
+    ) -> List[RetrieverResult]:
+        """Search chat history, the legal corpus and the BM25 index, falling back to keywords.
+
+        With a `session_id` that has uploads, the session's partition is
+        searched alongside the shared corpus and fused with it.
+
+        `concurrent` defaults to RETRIEVER_CONCURRENT; when enabled every source
+        is queried in parallel so latency tracks the slowest source, not the sum.
+        """
+        if concurrent is None:
+            concurrent = RETRIEVER_CONCURRENT
+        # Both collections use the same embedding model, so embed the query once
+        query_embedding = self._embed_query(query)
+
+        sources = self._sources(query, top_k, session_id, query_embedding)
+        ranked = self._run_sources(sources, concurrent)
 
-        # Merge combined results with fallback if needed
-        if combined:
-            # sort by score and return top_k
-            combined.sort(key=lambda r: r.score, reverse=True)
-            # dedupe by content text (keep highest score)
+        return self._merge(query, ranked, top_k)
+
+    def _merge(self, query: str, ranked: Dict[str, List[RetrieverResult]], top_k: int) -> List[RetrieverResult]:
+        """Fuse per-source rankings with reciprocal-rank fusion, or fall back to keywords.
+
+        Each hit contributes weight / (RRF_K + rank) for every source that
+        returned it (matched by content), so vector and BM25 scores never have
+        to be compared directly. Vector hits below RETRIEVER_MIN_SCORE are
+        ignored. Fused scores are scaled to 0..1.
+        """
+        fused: Dict[str, RetrieverResult] = {}
+        for name, hits in ranked.items():
+            weight = _SOURCE_WEIGHTS.get(name, 1.0)
+            if name in _SIMILARITY_SOURCES:
+                hits = [h for h in hits if h.score >= RETRIEVER_MIN_SCORE]
             seen = set()
-            deduped: List[RetrieverResult] = []
-            for r in combined:
-                key = (r.content or "").strip()
+            for rank, hit in enumerate(hits, start=1):
+                key = (hit.content or "").strip()
                 if not key or key in seen:
                     continue
                 seen.add(key)
-                deduped.append(r)
-            return deduped[:top_k]
+                contribution = weight / (RRF_K + rank)
+                if key in fused:
+                    fused[key].score += contribution
+                else:
+                    fused[key] = RetrieverResult(
+                        title=hit.title, content=hit.content, score=contribution, metadata=dict(hit.metadata)
+                    )
 
-        scored.sort(key=lambda r: r.score, reverse=True)
-        return scored[:top_k]
\ No newline at end of file
+        if not fused:
+            return self._keyword_fallback(query, top_k)
+
+        max_score = sum(_SOURCE_WEIGHTS.get(name, 1.0) for name in ranked) / (RRF_K + 1)
+        results = sorted(fused.values(), key=lambda r: r.score, reverse=True)[:top_k]
+        for r in results:
+            r.score = min(1.0, r.score / max_score) if max_score else 0.0
+        return results
+
+    # ------------------------------------------------------------------ #
+    def search_many(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        session_id: str | None = None,
+    ) -> List[List[RetrieverResult]]:
+        """Run `search` for several queries, batching the expensive parts.
+
+        All queries are embedded in one model call and the legal corpus (and
+        the session partition, if any) is hit with a single multi-query request. Returns one result list per
+        query, in order.
+        """
+        if not queries:
+            return []
+        embeddings = self._embed_queries(queries)
+        per_query: List[Dict[str, List[RetrieverResult]]] = [{} for _ in queries]
+        batch_embeddings = embeddings if all(e is not None for e in embeddings) else None
+        partition = self._partition(session_id)
+
+        corpus = self.vdb if self.vector_ready else None
+        for name, vdb in (("corpus", corpus), ("session", partition)):
+            if vdb is None:
+                continue
+            try:
+                batched = vdb.search_many(queries, top_k=top_k, query_embeddings=batch_embeddings)
+                for i, hits in enumerate(batched):
+                    per_query[i][name] = [RetrieverResult.from_hit(hit) for hit in hits]
+            except Exception:
+                pass
+
+        for i, (query, embedding) in enumerate(zip(queries, embeddings)):
+            if getattr(self, "chat_store", None):
+                try:
+                    per_query[i]["chat"] = self._search_chat(query, top_k, embedding)
+                except Exception:
+                    pass
+            if getattr(self, "bm25", None):
+                try:
+                    per_query[i]["bm25"] = self._search_bm25(query, top_k)
+                except Exception:
+                    pass
+            if partition is not None and partition.lexical_index is not None:
+                try:
+                    per_query[i]["session_bm25"] = self._search_bm25(query, top_k, index=partition.lexical_index)
+                except Exception:
+                    pass
+
+        return [self._merge(q, ranked, top_k) for q, ranked in zip(queries, per_query)]
+
+
+# Shared retriever for the RAG pipeline and the agent tools
+_retriever: Optional[Retriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_retriever() -> Retriever:
+    global _retriever
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = Retriever()
+    return _retriever
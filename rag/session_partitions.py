@@ -0,0 +1,76 @@
+"""
+rag/session_partitions.py
+Per-session partitions for uploaded documents.
+
+Documents uploaded with a session_id are kept out of the shared statute index
+and stored in a partition of their own: a VectorDB on the flat NumPy backend
+plus a BM25 index, under SESSION_PARTITION_DIR/<session>. Session-scoped
+retrieval searches the shared index unfiltered and the session's partition
+side by side, so statutes are never filtered away and the cost of the session
+part tracks the size of that session's uploads, not of the whole corpus.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import SESSION_PARTITION_DIR
+from .bm25_index import BM25Index
+from .vector_db import VectorDB
+
+
+def _partition_name(session_id: str) -> str:
+    """Filesystem-safe directory name for `session_id` (readable prefix + hash)."""
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", session_id)[:40]
+    return f"{slug}-{hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:8]}"
+
+
+class SessionPartitions:
+    def __init__(self, root: Optional[Path] = None) -> None:
+        self.root = Path(root or SESSION_PARTITION_DIR)
+        self._lock = threading.Lock()
+        # Open partitions stay cached: ingestion and search must share one instance
+        self._open: Dict[str, VectorDB] = {}
+
+    def path_for(self, session_id: str) -> Path:
+        return self.root / _partition_name(session_id)
+
+    def get(self, session_id: Optional[str], create: bool = False) -> Optional[VectorDB]:
+        """Return the partition for `session_id`; None if it has none and `create` is False."""
+        if not session_id:
+            return None
+        with self._lock:
+            vdb = self._open.get(session_id)
+            if vdb is not None:
+                return vdb
+            directory = self.path_for(session_id)
+            if not create and not directory.exists():
+                return None
+            lexical = BM25Index(directory / "bm25_index.json")
+            lexical.load()
+            vdb = VectorDB(directory, collection_name="session", lexical_index=lexical, backend="flat")
+            self._open[session_id] = vdb
+            return vdb
+
+    def revision(self, session_id: Optional[str]) -> Optional[int]:
+        """Content revision of a session's partition, or None when it has none."""
+        vdb = self.get(session_id)
+        if vdb is None or vdb.lexical_index is None:
+            return None
+        return vdb.lexical_index.revision
+
+
+_partitions: Optional[SessionPartitions] = None
+_partitions_lock = threading.Lock()
+
+
+def get_session_partitions() -> SessionPartitions:
+    global _partitions
+    with _partitions_lock:
+        if _partitions is None:
+            _partitions = SessionPartitions()
+    return _partitions
@@ -0,0 +1,240 @@
+"""
+rag/vector_backends.py
+Storage backends behind VectorDB.
+
+A backend stores (id, document, metadata, embedding) rows and answers nearest
+neighbour queries in Chroma's result shape, so VectorDB keeps one add/search
+code path whichever backend a collection uses:
+
+- ChromaBackend: the existing Chroma collection (HNSW, cosine space).
+- FlatNumpyBackend: exact brute-force search over a memory-mapped float16
+  matrix of unit-normalised vectors. At our corpus size (tens of thousands of
+  384-d vectors) a blocked matrix multiply beats HNSW, gives exact recall and
+  avoids SQLite entirely.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Rows scored per matrix-multiply block (bounds the float32 working copy)
+_FLAT_BLOCK_ROWS = 8192
+
+
+class VectorBackend:
+    """Interface shared by the VectorDB storage backends."""
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def existing_ids(self, ids: Sequence[str]) -> set:
+        """Return the subset of `ids` already stored."""
+        raise NotImplementedError
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        embeddings: Optional[Sequence[Sequence[float]]] = None,
+    ) -> None:
+        raise NotImplementedError
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        where: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, List[List[Any]]]:
+        """Return {ids, documents, metadatas, distances}, one list per query (cosine distance)."""
+        raise NotImplementedError
+
+
+class ChromaBackend(VectorBackend):
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def existing_ids(self, ids: Sequence[str]) -> set:
+        return set(self.collection.get(ids=list(ids), include=[]).get("ids", []))
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        kwargs: Dict[str, Any] = dict(ids=list(ids), documents=list(documents), metadatas=list(metadatas))
+        if embeddings is not None:
+            kwargs["embeddings"] = [list(e) for e in embeddings]
+        self.collection.upsert(**kwargs)
+
+    def query(self, query_embeddings, n_results, where=None):
+        kwargs: Dict[str, Any] = dict(
+            query_embeddings=[list(e) for e in query_embeddings],
+            n_results=n_results,
+            include=["documents", "metadatas", "distances"],
+        )
+        if where:
+            kwargs["where"] = where
+        return self.collection.query(**kwargs)
+
+
+class FlatNumpyBackend(VectorBackend):
+    """Exact cosine search over a memory-mapped float16 matrix.
+
+    On disk, under `directory`:
+      - {name}.f16     raw row-major float16 vectors (rows x dim)
+      - {name}.jsonl   append-only log of {row, id, dim, document, metadata}
+    Upserting an existing id rewrites its row in place; new ids append rows.
+    """
+
+    def __init__(self, directory: Path, name: str, embedding_fn) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / f"{name}.f16"
+        self.records_path = self.directory / f"{name}.jsonl"
+        self.embedding_fn = embedding_fn
+        self._lock = threading.RLock()
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._columns: Dict[str, np.ndarray] = {}
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    def _load(self) -> None:
+        if self.records_path.exists():
+            with self.records_path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from an interrupted write
+                    self._apply_record(rec)
+        if self.ids and self.dim:
+            # Drop log rows whose vector never made it to disk
+            size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+            rows = size // (self.dim * 2)
+            del self.ids[rows:], self.documents[rows:], self.metadatas[rows:]
+            self._row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self._remap()
+
+    def _apply_record(self, rec: Dict[str, Any]) -> None:
+        row = rec["row"]
+        if row > len(self.ids):
+            # Gap from an out-of-order or truncated log; the row has no data to point at
+            return
+        self.dim = rec.get("dim", self.dim)
+        if row == len(self.ids):
+            self.ids.append(rec["id"])
+            self.documents.append(rec["document"])
+            self.metadatas.append(rec["metadata"])
+        else:
+            previous = self.ids[row]
+            if previous != rec["id"] and self._row_of.get(previous) == row:
+                del self._row_of[previous]
+            self.ids[row] = rec["id"]
+            self.documents[row] = rec["document"]
+            self.metadatas[row] = rec["metadata"]
+        self._row_of[rec["id"]] = row
+
+    def _remap(self) -> None:
+        self._columns = {}
+        if not self.ids or not self.dim or not self.vectors_path.exists():
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode="r", shape=(len(self.ids), self.dim))
+
+    def _column(self, key: str) -> np.ndarray:
+        """Metadata column as an object array, built lazily for vectorised filtering."""
+        col = self._columns.get(key)
+        if col is None:
+            col = np.array([meta.get(key) for meta in self.metadatas], dtype=object)
+            self._columns[key] = col
+        return col
+
+    @staticmethod
+    def _normalise(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # ------------------------------------------------------------------ #
+    def count(self) -> int:
+        return len(self.ids)
+
+    def existing_ids(self, ids: Sequence[str]) -> set:
+        with self._lock:
+            return {doc_id for doc_id in ids if doc_id in self._row_of}
+
+    def upsert(self, ids, documents, metadatas, embeddings=None) -> None:
+        if not ids:
+            return
+        if embeddings is None:
+            embeddings = self.embedding_fn(list(documents))
+        vectors = self._normalise(np.asarray(embeddings, dtype=np.float32)).astype(np.float16)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            records = []
+            pending: Dict[str, int] = {}
+            next_row = len(self.ids)
+            mode = "r+b" if self.vectors_path.exists() else "w+b"
+            with open(self.vectors_path, mode) as vf:
+                for doc_id, doc, meta, vec in zip(ids, documents, metadatas, vectors):
+                    row = self._row_of.get(doc_id, pending.get(doc_id))
+                    if row is None:
+                        row = pending[doc_id] = next_row
+                        next_row += 1
+                    vf.seek(row * self.dim * 2)
+                    vf.write(vec.tobytes())
+                    records.append(
+                        {"row": row, "id": doc_id, "dim": self.dim, "document": doc, "metadata": dict(meta or {})}
+                    )
+            with self.records_path.open("a", encoding="utf-8") as rf:
+                for rec in records:
+                    rf.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                    self._apply_record(rec)
+            self._remap()
+
+    def query(self, query_embeddings, n_results, where=None):
+        out: Dict[str, List[List[Any]]] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            matrix = self._matrix
+            n_rows = 0 if matrix is None else matrix.shape[0]
+            mask = None
+            if where and n_rows:
+                mask = np.ones(n_rows, dtype=bool)
+                for key, value in where.items():
+                    mask &= self._column(key) == value
+            ids, documents, metadatas = self.ids, self.documents, self.metadatas
+
+        queries = self._normalise(np.asarray(query_embeddings, dtype=np.float32))
+        for q in queries:
+            if not n_rows or n_results <= 0:
+                for key in out:
+                    out[key].append([])
+                continue
+            sims = np.empty(n_rows, dtype=np.float32)
+            for start in range(0, n_rows, _FLAT_BLOCK_ROWS):
+                block = np.asarray(matrix[start : start + _FLAT_BLOCK_ROWS], dtype=np.float32)
+                sims[start : start + block.shape[0]] = block @ q
+            if mask is not None:
+                sims[~mask] = -np.inf
+            k = min(n_results, int(mask.sum()) if mask is not None else n_rows)
+            if k <= 0:
+                top = np.empty(0, dtype=np.int64)
+            else:
+                top = np.argpartition(-sims, k - 1)[:k]
+                top = top[np.argsort(-sims[top])]
+            out["ids"].append([ids[i] for i in top])
+            out["documents"].append([documents[i] for i in top])
+            out["metadatas"].append([metadatas[i] for i in top])
+            out["distances"].append([float(1.0 - sims[i]) for i in top])
+        return out
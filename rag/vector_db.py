@@ -5,14 +5,28 @@ Utility wrapper around ChromaDB for LexiGPT.
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
 import re
 from pathlib import Path
-from typing import Dict, List, Sequence, Optional
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Optional
 
-import chromadb
-from chromadb.utils import embedding_functions
+from config import INGEST_BATCH_SIZE, VECTOR_DB_BACKEND, VECTOR_DB_WRITE_BATCH
+from utils.file_utils import file_sha256
+from .bm25_index import BM25Index
+from .chroma_registry import (
+    embed_documents,
+    get_client,
+    get_collection,
+    get_embedding_function,
+    get_model_embedder,
+    get_query_embedder,
+)
+from .vector_backends import ChromaBackend, FlatNumpyBackend, VectorBackend
+
+# .txt uploads are read in blocks of this many characters
+_TEXT_BLOCK_CHARS = 64 * 1024
 
 
 def _clean_text(text: str) -> str:
@@ -22,6 +36,16 @@ def _clean_text(text: str) -> str:
     return text.strip()
 
 
+def _chunk_id(document: str, session_id: str, content: str) -> str:
+    """Content-addressed chunk id: identical chunks from the same document/session collide on purpose.
+
+    `document` identifies the document by its contents (see `doc_hash`), so a
+    file uploaded again under another name maps onto the same ids.
+    """
+    digest = hashlib.sha256(f"{document}\x00{session_id}\x00{content}".encode("utf-8")).hexdigest()
+    return f"chunk-{digest[:32]}"
+
+
 def _chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 150) -> List[str]:
     if not text:
         return []
@@ -39,9 +63,103 @@ def _chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 150) ->
     return chunks
 
 
+def _iter_chunks(pages: Iterable[str], chunk_size: int = 1000, chunk_overlap: int = 150) -> Iterator[str]:
+    """Streaming counterpart of `_chunk_text` over an iterable of page texts.
+
+    Pages are joined with newlines and cut into the same fixed windows as
+    `_chunk_text`, but only about one chunk of text is buffered at a time.
+    """
+    step = max(1, chunk_size - chunk_overlap)
+    buffer = ""
+    emitted = False
+    for page_text in pages:
+        if not page_text:
+            continue
+        buffer = f"{buffer}\n{page_text}" if buffer else page_text
+        while len(buffer) >= chunk_size:
+            yield buffer[:chunk_size]
+            emitted = True
+            buffer = buffer[step:]
+    # Remaining tail holds new text only if it extends past the last overlap
+    if buffer and (not emitted or len(buffer) > chunk_overlap):
+        yield buffer
+
+
+def _iter_document_pages(p: Path) -> Iterator[str]:
+    """Yield cleaned text page by page (or block by block) from a document.
+
+    Falls back to unstructured and then to a raw text read when the primary
+    extractor yields nothing.
+    """
+    yielded = False
+    suffix = p.suffix.lower()
+    # Try PDF first
+    if suffix == ".pdf":
+        try:
+            from pypdf import PdfReader
+
+            reader = PdfReader(str(p))
+            for page in reader.pages:
+                page_text = _clean_text(page.extract_text() or "")
+                if page_text:
+                    yielded = True
+                    yield page_text
+        except Exception:
+            pass
+    elif suffix in (".txt",):
+        with p.open("r", encoding="utf-8", errors="ignore") as fh:
+            while True:
+                block = fh.read(_TEXT_BLOCK_CHARS)
+                if not block:
+                    break
+                block = _clean_text(block)
+                if block:
+                    yielded = True
+                    yield block
+    elif suffix in (".docx",):
+        try:
+            import docx
+
+            doc = docx.Document(str(p))
+            para_text = _clean_text("\n".join(para.text for para in doc.paragraphs))
+            if para_text:
+                yielded = True
+                yield para_text
+        except Exception:
+            pass
+    if yielded:
+        return
+
+    # If text extraction empty and unstructured available, try partition
+    try:
+        from unstructured.partition.pdf import partition_pdf
+
+        for el in partition_pdf(str(p)):
+            el_text = _clean_text(str(el))
+            if el_text:
+                yielded = True
+                yield el_text
+    except Exception:
+        pass
+    if yielded:
+        return
+
+    # last resort: read raw bytes
+    try:
+        text = _clean_text(p.read_text(encoding="utf-8", errors="ignore"))
+    except Exception:
+        text = ""
+    if text:
+        yield text
+
+
 class VectorDB:
     """Simple helper around Chroma to add/search legal documents.
 
+    Storage goes through a pluggable backend (see rag.vector_backends):
+    `backend="chroma"` (default, HNSW) or `backend="flat"` (exact NumPy search
+    over memory-mapped float16 vectors), chosen per collection.
+
     This class also includes a convenience method `process_and_embed_document`
     which extracts text from a file (PDF, TXT, DOCX if python-docx is installed),
     chunks it, and stores chunks with metadata (including optional session_id).
@@ -52,39 +170,51 @@ class VectorDB:
         persist_dir: Path,
         collection_name: str = "lexigpt_legal_corpus",
         auto_seed_file: Optional[Path] = None,
+        lexical_index: Optional[BM25Index] = None,
+        backend: Optional[str] = None,
     ) -> None:
         self.persist_dir = Path(persist_dir)
-        self.persist_dir.mkdir(parents=True, exist_ok=True)
-
-        # Use persistent client (wraps same underlying storage used elsewhere)
-        try:
-            self.client = chromadb.PersistentClient(path=str(self.persist_dir))
-        except Exception:
-            # fallback to regular client for environments without PersistentClient
-            self.client = chromadb.Client()
-
-        self.embedding_fn = embedding_functions.DefaultEmbeddingFunction()
-        self.collection = self.client.get_or_create_collection(
-            name=collection_name,
-            embedding_function=self.embedding_fn,
-            metadata={"hnsw:space": "cosine"},
-        )
+        # Optional BM25 index kept in step with `add` so uploads are lexically searchable
+        self.lexical_index = lexical_index
+
+        # Embedding model is shared process-wide; storage is chosen per collection
+        self.embedding_fn = get_embedding_function()
+        self.query_embedder = get_query_embedder()
+        self.backend_name = (backend or VECTOR_DB_BACKEND).lower()
+        if self.backend_name == "flat":
+            self.client = None
+            self.collection = None
+            self.backend: VectorBackend = FlatNumpyBackend(self.persist_dir / "flat", collection_name, get_model_embedder())
+        else:
+            self.client = get_client(self.persist_dir)
+            self.collection = get_collection(self.persist_dir, collection_name, metadata={"hnsw:space": "cosine"})
+            self.backend = ChromaBackend(self.collection)
 
         if auto_seed_file:
             self._maybe_seed(auto_seed_file)
 
     # ------------------------------------------------------------------ #
     def _maybe_seed(self, json_path: Path) -> None:
-        if self.collection.count() > 0:
+        if self.backend.count() > 0:
             return
+        self.seed(json_path)
+
+    def seed(self, json_path: Path, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Embed the rows of `json_path` (combined.json) that are not stored yet.
+
+        Works in batches of VECTOR_DB_WRITE_BATCH and is resumable: rows already
+        present are skipped, so an interrupted seed continues where it stopped.
+        `progress(done, total)` is called after each batch. Returns rows written.
+        """
+        json_path = Path(json_path)
         if not json_path.exists():
-            return
+            return 0
 
         with json_path.open("r", encoding="utf-8") as fh:
             try:
                 rows = json.load(fh)
             except json.JSONDecodeError:
-                return
+                return 0
 
         documents: List[str] = []
         metadatas: List[Dict[str, str]] = []
@@ -99,149 +229,247 @@ class VectorDB:
             metadatas.append({"title": title})
             ids.append(f"doc-{idx}")
 
-        if documents:
-            self.collection.add(documents=documents, metadatas=metadatas, ids=ids)
+        total = len(ids)
+        if self.backend.count() >= total:
+            if progress:
+                progress(total, total)
+            return 0
+
+        written = 0
+        for start in range(0, total, VECTOR_DB_WRITE_BATCH):
+            batch_ids = ids[start : start + VECTOR_DB_WRITE_BATCH]
+            existing = self.backend.existing_ids(batch_ids)
+            keep = [i for i, doc_id in enumerate(batch_ids) if doc_id not in existing]
+            if keep:
+                batch_docs = [documents[start + i] for i in keep]
+                self.backend.upsert(
+                    ids=[batch_ids[i] for i in keep],
+                    documents=batch_docs,
+                    metadatas=[metadatas[start + i] for i in keep],
+                    embeddings=embed_documents(batch_docs),
+                )
+                written += len(keep)
+            if progress:
+                progress(min(start + VECTOR_DB_WRITE_BATCH, total), total)
+        return written
 
     # ------------------------------------------------------------------ #
-    def add(self, docs: Sequence[Dict[str, str]] | Sequence[str]) -> None:
+    def add(self, docs: Sequence[Dict[str, str]] | Sequence[str], persist_lexical: bool = True) -> int:
         """Add additional documents to the collection.
 
         Accepts either a list of strings or a list of dicts with keys:
           - content (required)
           - title (optional)
           - metadata (optional dict) which will be stored alongside the document
+
+        IDs are derived from (doc_hash or source, session_id, content), so re-adding the same
+        chunk is a no-op: chunks already present are skipped before embedding and
+        the rest are upserted in batches of VECTOR_DB_WRITE_BATCH. Returns the
+        number of chunks actually written. Pass `persist_lexical=False` to defer
+        saving the BM25 index when adding many batches in a row.
         """
         documents: List[str] = []
         metadatas: List[Dict[str, str]] = []
         ids: List[str] = []
+        seen = set()
 
-        start_index = self.collection.count()
-        for offset, doc in enumerate(docs):
-            idx = start_index + offset
+        for doc in docs:
             if isinstance(doc, str):
                 content = doc
-                title = f"Doc {idx+1}"
-                meta = {"title": title}
+                meta = {}
             else:
                 content = doc.get("content", "")
-                title = doc.get("title", f"Doc {idx+1}")
                 meta = dict(doc.get("metadata", {}))
-                meta.setdefault("title", title)
+                if doc.get("title"):
+                    meta.setdefault("title", doc["title"])
             if not content:
                 continue
+            doc_id = _chunk_id(meta.get("doc_hash") or meta.get("source", ""), meta.get("session_id", ""), content)
+            if doc_id in seen:
+                continue
+            seen.add(doc_id)
+            meta.setdefault("title", f"Doc {doc_id[6:14]}")
             documents.append(content)
             metadatas.append(meta)
-            ids.append(f"adhoc-{idx}")
+            ids.append(doc_id)
+
+        written = 0
+        for start in range(0, len(ids), VECTOR_DB_WRITE_BATCH):
+            batch_ids = ids[start : start + VECTOR_DB_WRITE_BATCH]
+            batch_docs = documents[start : start + VECTOR_DB_WRITE_BATCH]
+            batch_metas = metadatas[start : start + VECTOR_DB_WRITE_BATCH]
+
+            # Skip chunks already stored so re-ingesting a file does not re-embed it
+            try:
+                existing = self.backend.existing_ids(batch_ids)
+            except Exception:
+                existing = set()
+            keep = [i for i, doc_id in enumerate(batch_ids) if doc_id not in existing]
+            if not keep:
+                continue
+            batch_ids = [batch_ids[i] for i in keep]
+            batch_docs = [batch_docs[i] for i in keep]
+            batch_metas = [batch_metas[i] for i in keep]
 
-        if documents:
-            self.collection.add(documents=documents, metadatas=metadatas, ids=ids)
+            self.backend.upsert(
+                ids=batch_ids, documents=batch_docs, metadatas=batch_metas, embeddings=embed_documents(batch_docs)
+            )
+            written += len(batch_ids)
+            if self.lexical_index is not None:
+                try:
+                    self.lexical_index.add(
+                        [{"id": i, "content": d, "metadata": m} for i, d, m in zip(batch_ids, batch_docs, batch_metas)],
+                        persist=persist_lexical,
+                    )
+                except Exception:
+                    pass
+        return written
 
     # ------------------------------------------------------------------ #
-    def search(self, query: str, top_k: int = 3, where: Optional[Dict[str, str]] = None) -> List[Dict[str, str]]:
-        """Return top_k hits as dicts: {title, content, score}.
+    def embed_query(self, query: str) -> List[float]:
+        """Embed a single query string with this collection's embedding function."""
+        return self.embed_queries([query])[0]
 
-        Allows passing a `where` dict to scope results by metadata (e.g. session_id).
-        """
-        if not query or not str(query).strip():
+    def embed_queries(self, queries: Sequence[str]) -> List[List[float]]:
+        """Embed several query strings, batched with concurrent callers' queries."""
+        if not queries:
             return []
+        return [[float(x) for x in emb] for emb in self.query_embedder(list(queries))]
 
-        query_kwargs = dict(
-            query_texts=[query],
-            n_results=top_k,
-            include=["documents", "metadatas", "distances"],
-        )
-        if where:
-            query_kwargs["where"] = where
-
-        results = self.collection.query(**query_kwargs)
+    # ------------------------------------------------------------------ #
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        where: Optional[Dict[str, str]] = None,
+        query_embedding: Optional[Sequence[float]] = None,
+    ) -> List[Dict[str, str]]:
+        """Return top_k hits as dicts: {title, content, score}.
 
-        docs = results.get("documents", [[]])[0]
-        metas = results.get("metadatas", [[]])[0]
-        dists = results.get("distances", [[]])[0]
+        Allows passing a `where` dict to scope results by metadata (e.g. session_id).
+        When `query_embedding` is given it is sent to Chroma as-is, so callers
+        that already embedded the query avoid a second model run.
+        """
+        embeddings = [query_embedding] if query_embedding is not None else None
+        return self.search_many([query], top_k=top_k, where=where, query_embeddings=embeddings)[0]
 
-        hits: List[Dict[str, str]] = []
-        for doc, meta, dist in zip(docs, metas, dists):
-            hits.append(
-                {
-                    "title": meta.get("title", "Legal Reference"),
-                    "content": doc,
-                    "score": max(0.0, 1 - float(dist)) if dist is not None else 0.0,
-                    "metadata": meta,
-                }
-            )
-        return hits
+    # ------------------------------------------------------------------ #
+    def search_many(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        where: Optional[Dict[str, str]] = None,
+        query_embeddings: Optional[Sequence[Sequence[float]]] = None,
+    ) -> List[List[Dict[str, str]]]:
+        """Search for several queries with a single batched backend query.
+
+        All queries are embedded in one batch and sent as one request. Returns
+        one hit list per input query, in order; blank queries get an empty list.
+        `query_embeddings`, if given, must align with `queries`.
+        """
+        out: List[List[Dict[str, str]]] = [[] for _ in queries]
+        positions = [i for i, q in enumerate(queries) if q and str(q).strip()]
+        if not positions:
+            return out
+
+        if query_embeddings is not None:
+            embeddings = [list(query_embeddings[i]) for i in positions]
+        else:
+            embeddings = self.embed_queries([queries[i] for i in positions])
+
+        results = self.backend.query(embeddings, n_results=top_k, where=where)
+
+        all_docs = results.get("documents") or []
+        all_metas = results.get("metadatas") or []
+        all_dists = results.get("distances") or []
+
+        for row, pos in enumerate(positions):
+            docs = all_docs[row] if row < len(all_docs) else []
+            metas = all_metas[row] if row < len(all_metas) else []
+            dists = all_dists[row] if row < len(all_dists) else []
+            hits: List[Dict[str, str]] = []
+            for doc, meta, dist in zip(docs, metas, dists):
+                meta = meta or {}
+                hits.append(
+                    {
+                        "title": meta.get("title", "Legal Reference"),
+                        "content": doc,
+                        "score": max(0.0, 1 - float(dist)) if dist is not None else 0.0,
+                        "metadata": meta,
+                    }
+                )
+            out[pos] = hits
+        return out
 
     # ------------------------------------------------------------------ #
     def is_empty(self) -> bool:
-        return self.collection.count() == 0
+        return self.backend.count() == 0
 
     # ------------------------------------------------------------------ #
-    def process_and_embed_document(self, file_path: str | Path, session_id: Optional[str] = None) -> Dict[str, int]:
+    def process_and_embed_document(
+        self,
+        file_path: str | Path,
+        session_id: Optional[str] = None,
+        progress: Optional[Callable[[Dict[str, int]], None]] = None,
+        write: Optional[Callable[..., int]] = None,
+    ) -> Dict[str, int]:
         """Extract text from `file_path`, chunk, and add to the Chroma collection.
 
-        Returns a small summary dict: { inserted_chunks: int }
+        Pages are streamed, chunked across page boundaries and written in
+        batches of INGEST_BATCH_SIZE, so memory stays flat with document size
+        and early chunks are searchable before the whole file is processed.
+        `progress`, if given, is called after every batch with
+        { pages, inserted_chunks, new_chunks } so far. `write` replaces
+        `self.add` for each batch (same signature), e.g. to funnel writes from
+        several ingestion workers through one writer.
+
+        Returns a small summary dict: { inserted_chunks: int, new_chunks: int }
+        (`new_chunks` excludes chunks that were already indexed). Chunk ids
+        come from the file's content hash, not its name, so indexing the same
+        document again writes no new chunks.
         """
         p = Path(file_path)
         if not p.exists():
             raise FileNotFoundError(str(p))
 
         name = p.name
-        text = ""
-        # Try PDF first
-        if p.suffix.lower() == ".pdf":
-            try:
-                from pypdf import PdfReader
-
-                reader = PdfReader(str(p))
-                parts: List[str] = []
-                for page in reader.pages:
-                    page_text = page.extract_text() or ""
-                    parts.append(page_text)
-                text = _clean_text("\n".join(parts))
-            except Exception:
-                text = ""
-        elif p.suffix.lower() in (".txt",):
-            text = _clean_text(p.read_text(encoding="utf-8", errors="ignore"))
-        elif p.suffix.lower() in (".docx",):
-            try:
-                import docx
-
-                doc = docx.Document(str(p))
-                parts = [para.text for para in doc.paragraphs]
-                text = _clean_text("\n".join(parts))
-            except Exception:
-                text = ""
-
-        # If text extraction empty and unstructured available, try partition
-        if not text:
-            try:
-                from unstructured.partition.pdf import partition_pdf
-
-                elements = partition_pdf(str(p))
-                text = _clean_text("\n".join([str(el) for el in elements]))
-            except Exception:
-                pass
-
-        if not text:
-            # last resort: read raw bytes
-            try:
-                text = _clean_text(p.read_text(encoding="utf-8", errors="ignore"))
-            except Exception:
-                text = ""
-
-        if not text:
-            return {"inserted_chunks": 0}
-
-        chunks = _chunk_text(text)
-        docs = []
-        for i, c in enumerate(chunks):
-            docs.append(
+        doc_hash = file_sha256(p)
+        counters = {"pages": 0, "inserted_chunks": 0, "new_chunks": 0}
+        write = write or self.add
+
+        def _counted_pages() -> Iterator[str]:
+            for page_text in _iter_document_pages(p):
+                counters["pages"] += 1
+                yield page_text
+
+        def _flush(batch: List[Dict]) -> None:
+            counters["new_chunks"] += write(batch, persist_lexical=False)
+            counters["inserted_chunks"] += len(batch)
+            if progress is not None:
+                try:
+                    progress(dict(counters))
+                except Exception:
+                    pass
+
+        batch: List[Dict] = []
+        for i, c in enumerate(_iter_chunks(_counted_pages())):
+            batch.append(
                 {
                     "content": c,
                     "title": f"{name}::chunk-{i}",
-                    "metadata": {"source": name, "chunk_id": i, **({"session_id": session_id} if session_id else {})},
+                    "metadata": {"source": name, "doc_hash": doc_hash, "chunk_id": i, **({"session_id": session_id} if session_id else {})},
                 }
             )
-
-        self.add(docs)
-        return {"inserted_chunks": len(docs)}
+            if len(batch) >= INGEST_BATCH_SIZE:
+                _flush(batch)
+                batch = []
+        if batch:
+            _flush(batch)
+
+        # The lexical index is persisted once per document rather than per batch
+        if counters["new_chunks"] and self.lexical_index is not None:
+            try:
+                self.lexical_index.save()
+            except Exception:
+                pass
+        return {"inserted_chunks": counters["inserted_chunks"], "new_chunks": counters["new_chunks"]}
@@ -19,6 +19,12 @@ def create_chat():
     return jsonify({"session_id": session_id})
 
 
+@bp.route("/sync-index", methods=["POST"])
+def sync_index():
+    """Index messages added to the history file since the last sync."""
+    return jsonify({"status": "ok", "indexed": chat_history.sync_vector_index()})
+
+
 @bp.route("/<session_id>", methods=["GET"])
 def get_chat(session_id: str):
     session = chat_history.get_session(session_id)
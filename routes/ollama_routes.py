@@ -1,18 +1,34 @@
-from flask import Blueprint, jsonify, request, Response
+from flask import Blueprint, jsonify, request, Response, stream_with_context
+import json
 import re
 import threading
+import time
 
-from config import DEFAULT_CHAT_SYSTEM_PROMPT
+from config import DEFAULT_CHAT_SYSTEM_PROMPT, LLM_CACHE_ENABLED
 from services import chat_history
-from services.ollama_services import llm_chat, query_ollama_with_rag, stream_llm_chat
+from services.conversation_memory import build_history
+from services.llm_cache import get_llm_cache
+from services.ollama_client import limiter_stats
+from services.ollama_services import llm_chat, query_ollama_with_rag, stream_llm_chat, stream_query_with_rag
 from uuid import uuid4
 
 # In-memory registry for pending streams. Structure: { stream_id: { message, session_id, history } }
 _STREAM_REGISTRY = {}
+_STREAM_LOCK = threading.Lock()
+# Registered streams nobody connects to within this many seconds are dropped
+_STREAM_TTL = 120
 
 bp = Blueprint("chat", __name__, url_prefix="/api")
 
 
+@bp.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    """LLM limiter metrics (in-flight calls, queue depth, waits per priority class) and cache counters."""
+    stats = limiter_stats()
+    stats["cache"] = get_llm_cache().stats() if LLM_CACHE_ENABLED else None
+    return jsonify(stats)
+
+
 @bp.route("/chat", methods=["POST"])
 def chat():
     data = request.get_json(force=True) or {}
@@ -91,7 +107,7 @@ def chat():
         bot_response = llm_chat(
             DEFAULT_CHAT_SYSTEM_PROMPT,
             user_message,
-            history=history,
+            history=build_history(session_id, history, user_message),
         )
         rag_payload = {}
 
@@ -128,7 +144,7 @@ def chat():
                 f"\n\nContext:\n{context_block}\n\nAssistant answer:\n{assistant_text}\n\nJSON:\n"
             )
             try:
-                expl_text = llm_chat(None, expl_prompt)
+                expl_text = llm_chat(None, expl_prompt, use_cache=True)
                 # try to parse JSON from the model output; fall back to raw text
                 import json as _json
 
@@ -156,3 +172,104 @@ def chat():
             "context": rag_payload.get("context"),
         }
     )
+
+
+@bp.route("/chat/stream", methods=["POST"])
+def start_chat_stream():
+    """Register a streaming chat turn.
+
+    POST JSON: { message, session_id?, mode?: "chat" | "rag" }
+    Returns { stream_id, session_id }; open GET /api/chat/stream/<stream_id>
+    with EventSource to receive the answer.
+    """
+    data = request.get_json(force=True) or {}
+    user_message = (data.get("message") or "").strip()
+    session_id = data.get("session_id")
+    mode = data.get("mode", "chat")
+
+    if not user_message:
+        return jsonify({"error": "message is required"}), 400
+
+    history = []
+    if session_id:
+        session = chat_history.get_session(session_id)
+        if session:
+            history = session.get("messages", [])
+
+    session_id = chat_history.ensure_session(session_id, user_message[:60])
+    chat_history.append_message(session_id, "user", user_message)
+
+    stream_id = uuid4().hex
+    now = time.time()
+    with _STREAM_LOCK:
+        for sid in [sid for sid, entry in _STREAM_REGISTRY.items() if now - entry["created_at"] > _STREAM_TTL]:
+            del _STREAM_REGISTRY[sid]
+        _STREAM_REGISTRY[stream_id] = {
+            "message": user_message,
+            "session_id": session_id,
+            "history": history,
+            "mode": mode,
+            "created_at": now,
+        }
+    return jsonify({"stream_id": stream_id, "session_id": session_id})
+
+
+@bp.route("/chat/stream/<stream_id>", methods=["GET"])
+def chat_stream(stream_id):
+    """Stream a registered chat turn as Server-Sent Events.
+
+    Events (JSON in `data:`), in order:
+      {type: 'sources', context: [...]}          (RAG mode, before any token)
+      {type: 'token', text: '...'}               (repeated)
+      {type: 'done', session_id, response}       (after the answer is saved)
+      {type: 'error', error: '...'}
+    Closing the connection cancels the request to Ollama; the partial answer
+    is not saved.
+    """
+    with _STREAM_LOCK:
+        entry = _STREAM_REGISTRY.pop(stream_id, None)
+    if entry is None:
+        return jsonify({"error": "unknown or expired stream"}), 404
+
+    def event(payload):
+        return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def gen():
+        tokens = None
+        try:
+            if entry["mode"] == "rag":
+                rag_payload = stream_query_with_rag(entry["message"], session_id=entry["session_id"])
+                yield event({"type": "sources", "context": rag_payload["context"]})
+                tokens = rag_payload["tokens"]
+            else:
+                tokens = stream_llm_chat(
+                    DEFAULT_CHAT_SYSTEM_PROMPT,
+                    entry["message"],
+                    history=build_history(entry["session_id"], entry["history"], entry["message"]),
+                )
+            parts = []
+            for token in tokens:
+                parts.append(token)
+                yield event({"type": "token", "text": token})
+            bot_response = "".join(parts)
+            chat_history.append_message(entry["session_id"], "assistant", bot_response)
+            yield event({"type": "done", "session_id": entry["session_id"], "response": bot_response})
+        except GeneratorExit:
+            # Client went away; the finally block below aborts the upstream request
+            return
+        except Exception as e:
+            # Details stay in the server log; the browser gets a generic message
+            import traceback
+
+            print(f"Chat stream error: {e}")
+            traceback.print_exc()
+            yield event({"type": "error", "error": "The model failed to produce a response. Please try again."})
+        finally:
+            if tokens is not None:
+                tokens.close()
+
+    return Response(
+        stream_with_context(gen()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
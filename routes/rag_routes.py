@@ -1,12 +1,76 @@
 # routes/rag_routes.py
 
-from flask import Blueprint, request, jsonify, current_app
+import json
+import threading
+
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from services.ollama_services import query_ollama_with_rag
+from rag.rag_pipeline import restart_seeding, retrieval_status
 from pathlib import Path
 from rag.vector_db import VectorDB
+from rag.bm25_index import get_bm25_index
+from rag.session_partitions import get_session_partitions
+from services import ingest_jobs
+from utils.file_utils import file_sha256
 
 bp = Blueprint("rag", __name__, url_prefix="/api")
 
+# Upload target store, created on first upload and reused afterwards
+_UPLOAD_VDB = None
+_UPLOAD_VDB_LOCK = threading.Lock()
+
+
+def _get_upload_vdb(session_id: str | None = None) -> VectorDB:
+    """Return the store for an upload: the session's own partition, or the shared upload store."""
+    if session_id:
+        return get_session_partitions().get(session_id, create=True)
+    global _UPLOAD_VDB
+    with _UPLOAD_VDB_LOCK:
+        if _UPLOAD_VDB is None:
+            # (uploaded chunks are mirrored into the shared BM25 index for lexical search)
+            _UPLOAD_VDB = VectorDB(Path("vector_data"), collection_name="lexigpt_legal_corpus", lexical_index=get_bm25_index())
+    return _UPLOAD_VDB
+
+
+def _save_upload(f, save_dir: Path) -> Path:
+    """Save an uploaded file under `save_dir` and return its path.
+
+    A file with the same name and identical contents is reused as-is, so
+    re-uploading a document indexes onto its existing chunks; a different file
+    with a taken name gets a numbered suffix instead of overwriting it.
+    """
+    filename = f.filename or "uploaded_file"
+    digest = file_sha256(f.stream)
+    dest = save_dir / filename
+    counter = 0
+    while dest.exists():
+        if file_sha256(dest) == digest:
+            return dest
+        counter += 1
+        dest = save_dir / f"{Path(filename).stem}_{counter}{Path(filename).suffix}"
+    f.save(str(dest))
+    return dest
+
+
+@bp.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: the app serves (lexical) retrieval while the vector corpus seeds.
+
+    Returns 200 with {mode, vector_ready, seeding: {state, done, total, ...}}.
+    """
+    return jsonify(retrieval_status())
+
+
+@bp.route("/ready", methods=["POST"])
+def retry_seeding():
+    """Restart corpus seeding after it failed; seeding resumes where it stopped.
+
+    Returns 202 with the status when a new run started, 200 if seeding is
+    already running or finished.
+    """
+    started = restart_seeding()
+    return jsonify(retrieval_status()), 202 if started else 200
+
 
 @bp.route("/rag-query", methods=["POST"])
 def rag_query():
@@ -28,8 +92,11 @@ def rag_query():
 def upload_and_index():
     """Accept multipart/form-data with files under key 'files'.
 
-    Optional form field: session_id — will be stored with document metadata
-    Returns inserted chunk counts per file.
+    Optional form field: session_id — documents go to that session's own
+    partition (searched alongside the shared corpus for that session)
+    Files are saved and queued for background ingestion; the response (202)
+    carries a job_id plus status/events URLs to follow per-file progress.
+    Pass wait=1 to index synchronously and get inserted chunk counts per file.
     """
     files = request.files.getlist("files")
     session_id = request.form.get("session_id") or request.args.get("session_id")
@@ -40,30 +107,56 @@ def upload_and_index():
     save_dir = Path("data/pdfs")
     save_dir.mkdir(parents=True, exist_ok=True)
 
-    # instantiate VectorDB against local vector store
-    vdb = VectorDB(Path("vector_data"), collection_name="lexigpt_legal_corpus")
+    # session partition, or the shared VectorDB against local vector store
+    vdb = _get_upload_vdb(session_id)
 
-    results = []
+    wait = (request.form.get("wait") or request.args.get("wait") or "").lower() in ("1", "true", "yes")
+
+    saved = []
     for f in files:
-        filename = f.filename or "uploaded_file"
-        dest = save_dir / filename
-        # avoid overwriting by appending counter if necessary
-        if dest.exists():
-            base = dest.stem
-            suf = dest.suffix
-            counter = 1
-            while True:
-                candidate = save_dir / f"{base}_{counter}{suf}"
-                if not candidate.exists():
-                    dest = candidate
-                    break
-                counter += 1
-        f.save(str(dest))
+        saved.append(_save_upload(f, save_dir))
+
+    if not wait:
+        job_id = ingest_jobs.submit_job(saved, vdb, session_id=session_id)
+        return jsonify({
+            "status": "queued",
+            "job_id": job_id,
+            "status_url": f"/api/upload/{job_id}",
+            "events_url": f"/api/upload/{job_id}/events",
+            "files": [dest.name for dest in saved],
+        }), 202
 
+    results = []
+    for dest in saved:
         try:
             out = vdb.process_and_embed_document(dest, session_id=session_id)
-            results.append({"file": dest.name, "inserted_chunks": out.get("inserted_chunks", 0)})
+            results.append({"file": dest.name, "inserted_chunks": out.get("inserted_chunks", 0), "new_chunks": out.get("new_chunks", 0)})
         except Exception as e:
             results.append({"file": dest.name, "error": str(e)})
 
     return jsonify({"status": "ok", "results": results})
+
+
+@bp.route("/upload/<job_id>", methods=["GET"])
+def upload_status(job_id: str):
+    """Return the current state of an ingestion job with per-file progress."""
+    job = ingest_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job)
+
+
+@bp.route("/upload/<job_id>/events")
+def upload_events(job_id: str):
+    """Stream ingestion job snapshots via Server-Sent Events until the job finishes."""
+    if ingest_jobs.get_job(job_id) is None:
+        return jsonify({"error": "job not found"}), 404
+
+    def gen():
+        for snapshot in ingest_jobs.iter_job_events(job_id):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+
+    return Response(stream_with_context(gen()), mimetype="text/event-stream")
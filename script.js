@@ -1537,7 +1537,10 @@ function handleMultipleFileUpload(files) {
                 throw new Error(txt || 'Upload failed');
             }
             const data = await res.json();
-            if (data && data.results) {
+            if (data && data.job_id) {
+                showToast('Files uploaded, indexing in background...', 'info');
+                followIngestJob(data);
+            } else if (data && data.results) {
                 const fileList = data.results.map(r => `${r.file}: ${r.inserted_chunks || r.error}`).join('\n');
                 appendMessage(`[Uploaded Documents]\n${fileList}`, 'user');
                 showToast('Files uploaded and indexed', 'success');
@@ -1558,6 +1561,27 @@ function handleMultipleFileUpload(files) {
     }
 }
 
+function followIngestJob(job) {
+    // Follow a background ingestion job over SSE until every file finishes
+    const source = new EventSource(`${API_BASE}${job.events_url}`);
+    source.onmessage = (evt) => {
+        let snapshot;
+        try { snapshot = JSON.parse(evt.data); } catch (e) { return; }
+        if (!['completed', 'partial', 'failed'].includes(snapshot.status)) return;
+        source.close();
+        const fileList = snapshot.files.map(f => `${f.file}: ${f.error || f.inserted_chunks}`).join('\n');
+        appendMessage(`[Uploaded Documents]\n${fileList}`, 'user');
+        if (snapshot.status === 'completed') showToast('Files uploaded and indexed', 'success');
+        else if (snapshot.status === 'partial') showToast('Some files failed to index', 'error');
+        else showToast('Indexing failed', 'error');
+        elements.app.classList.add('chat-active');
+    };
+    source.onerror = () => {
+        source.close();
+        showToast('Lost connection to indexing progress', 'error');
+    };
+}
+
 function exportChatAsJSON() {
     try {
         const messages = [];
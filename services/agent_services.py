@@ -16,8 +16,9 @@ from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
+from services.ollama_client import PRIORITY_BACKGROUND
 from services.ollama_services import llm_chat
-from rag.retriever import Retriever
+from rag.retriever import get_retriever
 from services.docgen_services import generate_document
 from utils.prompts import PLANNER_SYS_PROMPT, EVALUATOR_SYS_PROMPT
 
@@ -45,8 +46,6 @@ def _tool_regex_extract(args: Dict[str, Any]) -> Dict[str, Any]:
         return {"ok": False, "output": None, "logs": f"regex error: {e}"}
 
 
-RETRIEVER = Retriever()  # local retriever; uses vector DB if configured
-
 # Agent runtime hooks for streaming logs/events
 LOG_PATH = Path("data/agent_logs.jsonl")
 LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -83,13 +82,60 @@ def clear_agent_events_queue() -> None:
 
 
 def _tool_rag_search(args: Dict[str, Any]) -> Dict[str, Any]:
+    queries = args.get("queries")
+    if isinstance(queries, list):
+        return _tool_rag_search_many(args)
     q = args.get("query", "")
     session_id = args.get("session_id")
-    hits = RETRIEVER.search(q, top_k=args.get("top_k", 3), session_id=session_id)
+    hits = get_retriever().search(q, top_k=args.get("top_k", 3), session_id=session_id)
     serialised = [hit.__dict__ for hit in hits]
     return {"ok": True, "output": serialised, "logs": f"returned {len(hits)} hits"}
 
 
+def _tool_rag_search_many(args: Dict[str, Any]) -> Dict[str, Any]:
+    """Batched rag_search: input={queries:[str], top_k:int}. One embedding + one vector query for all."""
+    queries = [str(q) for q in (args.get("queries") or []) if q]
+    session_id = args.get("session_id")
+    batches = get_retriever().search_many(queries, top_k=args.get("top_k", 3), session_id=session_id)
+    serialised = [
+        {"query": q, "hits": [hit.__dict__ for hit in hits]}
+        for q, hits in zip(queries, batches)
+    ]
+    total = sum(len(hits) for hits in batches)
+    return {"ok": True, "output": serialised, "logs": f"returned {total} hits for {len(queries)} queries"}
+
+
+def _prefetch_rag_searches(steps: List["PlanStep"]) -> Dict[int, Dict[str, Any]]:
+    """Run every single-query rag_search step of a plan as one batched search.
+
+    Steps are grouped by (session_id, top_k) so each group costs one embedding
+    call and one vector query. Returns tool results keyed by step_id.
+    """
+    groups: Dict[tuple, List["PlanStep"]] = {}
+    for step in steps:
+        args = step.input or {}
+        if step.tool != "rag_search" or isinstance(args.get("queries"), list) or not args.get("query"):
+            continue
+        key = (args.get("session_id"), args.get("top_k", 3))
+        groups.setdefault(key, []).append(step)
+
+    prefetched: Dict[int, Dict[str, Any]] = {}
+    for (session_id, top_k), group in groups.items():
+        if len(group) < 2:
+            continue
+        try:
+            batches = get_retriever().search_many([s.input["query"] for s in group], top_k=top_k, session_id=session_id)
+        except Exception:
+            continue
+        for step, hits in zip(group, batches):
+            prefetched[step.step_id] = {
+                "ok": True,
+                "output": [hit.__dict__ for hit in hits],
+                "logs": f"returned {len(hits)} hits (batched)",
+            }
+    return prefetched
+
+
 def _tool_doc_generate(args: Dict[str, Any]) -> Dict[str, Any]:
     try:
         # args is either: (1) a dict with "payload"/"doc_payload" key, or (2) the payload itself with type/content
@@ -129,6 +175,7 @@ TOOL_MAP = {
     "read_file": _tool_read_file,
     "regex_extract": _tool_regex_extract,
     "rag_search": _tool_rag_search,
+    "rag_search_many": _tool_rag_search_many,
     "doc_generate": _tool_doc_generate,
 }
 
@@ -187,8 +234,9 @@ AVAILABLE TOOLS:
    Example input: {"text": "some text", "pattern": "\\d+"}
 
 4. "rag_search": Search knowledge base for information.
-   input={query:str, top_k:int}
+   input={query:str, top_k:int} or, for several lookups at once, {queries:[str], top_k:int}
    Example input: {"query": "rental agreement clauses", "top_k": 3}
+   Example input: {"queries": ["security deposit limits", "notice period for eviction"], "top_k": 3}
 
 5. "doc_generate": Generate and save a PDF/DOCX/XLSX/PPTX document.
    REQUIRED input format: {type:str, title:str, content:[objects]}
@@ -247,73 +295,95 @@ PLANNER_PROMPT_APPEND = (
 def draft_plan(goal: str) -> Plan:
     # Use string replace instead of .format() to avoid format placeholder interpretation errors
     prompt = PLANNER_PROMPT_TEMPLATE.replace('{goal}', goal) + PLANNER_PROMPT_APPEND
-    raw = llm_chat(PLANNER_SYS_PROMPT, prompt)
+    # Only plans that parse are cached, so a bad answer is never replayed for this goal
+    raw = llm_chat(
+        PLANNER_SYS_PROMPT,
+        prompt,
+        priority=PRIORITY_BACKGROUND,
+        use_cache=True,
+        validate=lambda text: _parse_plan(text) is not None,
+    )
     # Emit the raw planner output as an event for observability
     try:
         emit_event({"type": "planner_output", "raw": raw, "timestamp": int(time.time())})
     except Exception:
         pass
-    def _extract_json_block(s: str) -> Optional[str]:
-        # Try fenced code block first
-        if not s or not isinstance(s, str):
-            return None
-        import re
-
-        m = re.search(r"```json\s*(\{[\s\S]*?\})\s*```", s, flags=re.IGNORECASE)
-        if m:
-            return m.group(1)
-
-        # Try any fenced block
-        m = re.search(r"```[\s\S]*?\n(\{[\s\S]*?\})\s*```", s)
-        if m:
-            return m.group(1)
-
-        # Fallback: find first { and match braces until balanced
-        start = s.find('{')
-        if start == -1:
-            return None
-        depth = 0
-        for i in range(start, len(s)):
-            if s[i] == '{':
-                depth += 1
-            elif s[i] == '}':
-                depth -= 1
-                if depth == 0:
-                    return s[start:i+1]
-        return None
 
     # Primary parse attempt
+    plan = _parse_plan(raw)
+    if plan is not None:
+        return plan
+
+    # Retry politely asking for ONLY JSON (short instruction). The prompt is the
+    # same for every goal, so the first answer goes in as history and the
+    # response is never cached.
+    retry_prompt = "Return ONLY the exact same plan as valid JSON and nothing else. Do not add any explanation."
+    raw2 = llm_chat(
+        PLANNER_SYS_PROMPT,
+        retry_prompt,
+        history=[{"role": "user", "content": prompt}, {"role": "assistant", "content": raw}],
+        priority=PRIORITY_BACKGROUND,
+    )
+    plan = _parse_plan(raw2)
+    if plan is not None:
+        emit_event({"type": "planner_output", "raw": raw2, "timestamp": int(time.time())})
+        return plan
+
+    raise RuntimeError(f"Planner failed to produce valid JSON.\nRaw1:{raw}\nRaw2:{raw2}")
+
+
+def _extract_json_block(s: str) -> Optional[str]:
+    # Try fenced code block first
+    if not s or not isinstance(s, str):
+        return None
+    import re
+
+    m = re.search(r"```json\s*(\{[\s\S]*?\})\s*```", s, flags=re.IGNORECASE)
+    if m:
+        return m.group(1)
+
+    # Try any fenced block
+    m = re.search(r"```[\s\S]*?\n(\{[\s\S]*?\})\s*```", s)
+    if m:
+        return m.group(1)
+
+    # Fallback: find first { and match braces until balanced
+    start = s.find('{')
+    if start == -1:
+        return None
+    depth = 0
+    for i in range(start, len(s)):
+        if s[i] == '{':
+            depth += 1
+        elif s[i] == '}':
+            depth -= 1
+            if depth == 0:
+                return s[start:i+1]
+    return None
+
+
+def _json_value(raw: str, kind: type) -> Any:
+    """`raw` parsed as JSON if it is a `kind`, else None (the cache check for LLM answers)."""
     try:
-        data = json.loads(raw)
-        return Plan(**data)
+        value = json.loads(raw)
     except Exception:
-        # Try extracting a JSON block from mixed text
-        block = _extract_json_block(raw)
-        if block:
-            try:
-                data = json.loads(block)
-                return Plan(**data)
-            except Exception:
-                pass
+        return None
+    return value if isinstance(value, kind) else None
 
-    # Retry politely asking for ONLY JSON (short instruction)
-    retry_prompt = "Return ONLY the exact same plan as valid JSON and nothing else. Do not add any explanation."
-    raw2 = llm_chat(PLANNER_SYS_PROMPT, retry_prompt)
+
+def _parse_plan(raw: str) -> Optional[Plan]:
+    """Plan from raw planner output (bare JSON or a JSON block in mixed text), or None."""
     try:
-        data = json.loads(raw2)
-        emit_event({"type": "planner_output", "raw": raw2, "timestamp": int(time.time())})
-        return Plan(**data)
+        return Plan(**json.loads(raw))
     except Exception:
-        # Try extraction on second raw
-        block2 = _extract_json_block(raw2)
-        if block2:
+        # Try extracting a JSON block from mixed text
+        block = _extract_json_block(raw)
+        if block:
             try:
-                data = json.loads(block2)
-                return Plan(**data)
+                return Plan(**json.loads(block))
             except Exception:
                 pass
-
-    raise RuntimeError(f"Planner failed to produce valid JSON.\nRaw1:{raw}\nRaw2:{raw2}")
+    return None
 
 
 def execute_plan(plan: Plan) -> RunResult:
@@ -322,6 +392,9 @@ def execute_plan(plan: Plan) -> RunResult:
     # Reset stop flag for this run
     AGENT_STOP_EVENT.clear()
 
+    # Batch all retrieval steps up front instead of one round-trip per step
+    prefetched = _prefetch_rag_searches(plan.steps[: plan.max_iterations])
+
     for step in plan.steps[: plan.max_iterations]:
         # Check for external stop signal
         if AGENT_STOP_EVENT.is_set():
@@ -361,7 +434,13 @@ def execute_plan(plan: Plan) -> RunResult:
                             f"For the following document generation step, list the required field names as a JSON array of strings."
                             f"\n\nGOAL: {plan.goal}\nSTEP TITLE: {step.title}\nEXPECTATIONS: {step.expectations}\n"
                         )
-                        raw_fields = llm_chat(PLANNER_SYS_PROMPT, prompt_req)
+                        raw_fields = llm_chat(
+                            PLANNER_SYS_PROMPT,
+                            prompt_req,
+                            priority=PRIORITY_BACKGROUND,
+                            use_cache=True,
+                            validate=lambda text: _json_value(text, list) is not None,
+                        )
                         req = None
                         try:
                             req = json.loads(raw_fields)
@@ -417,7 +496,10 @@ def execute_plan(plan: Plan) -> RunResult:
             emit_event({"type": "agent_stopped", "reason": "stop_signal_received", "timestamp": int(time.time())})
             break
 
-        res = tool_fn(step.input)
+        if step.step_id in prefetched:
+            res = prefetched[step.step_id]
+        else:
+            res = tool_fn(step.input)
         preview = str(res.get("output", ""))[:400]
         logs.append(
             StepLog(
@@ -449,7 +531,13 @@ def execute_plan(plan: Plan) -> RunResult:
         f"PLAN:\n{plan.model_dump_json(indent=2)}\n\nLOGS:\n{json.dumps([l.dict() for l in logs], indent=2)}\n\n"
         "Return compact JSON with keys: { 'success': bool, 'summary': str, 'sources': [ { 'id': int, 'title': str, 'snippet': str } ] }"
     )
-    raw = llm_chat(EVALUATOR_SYS_PROMPT, eval_prompt)
+    raw = llm_chat(
+        EVALUATOR_SYS_PROMPT,
+        eval_prompt,
+        priority=PRIORITY_BACKGROUND,
+        use_cache=True,
+        validate=lambda text: _json_value(text, dict) is not None,
+    )
     try:
         report = json.loads(raw)
     except Exception:
@@ -0,0 +1,145 @@
+"""
+services/answer_cache.py
+Semantic cache for RAG answers.
+
+Entries are keyed by the query embedding: a new question is served from the
+cache when an earlier one in the same scope (session, top_k) has cosine
+similarity >= ANSWER_CACHE_THRESHOLD, the entry is younger than
+ANSWER_CACHE_TTL seconds and it was produced against the current version of
+the corpus that scope searches, chat history included (entries from older
+versions are dropped). The cache is LRU-bounded to ANSWER_CACHE_SIZE entries
+and persisted to ANSWER_CACHE_FILE so restarts keep it warm.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+from config import (
+    ANSWER_CACHE_FILE,
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL,
+)
+
+
+def _normalise(vec: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(x * x for x in vec))
+    if not norm:
+        return [float(x) for x in vec]
+    return [float(x) / norm for x in vec]
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: int = ANSWER_CACHE_SIZE,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl: float = ANSWER_CACHE_TTL,
+    ) -> None:
+        self.path = Path(path or ANSWER_CACHE_FILE)
+        self.max_entries = max(0, max_entries)
+        self.threshold = threshold
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except (OSError, json.JSONDecodeError):
+            return
+        for entry in payload.get("entries", []):
+            if "corpus_version" in entry:
+                self._entries[entry["key"]] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _save(self) -> None:
+        """Persist entries; caller holds the lock."""
+        payload = {"entries": list(self._entries.values())}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                json.dump(payload, fh, ensure_ascii=False)
+            tmp.replace(self.path)
+        except OSError:
+            pass
+
+    # ------------------------------------------------------------------ #
+    def get(self, embedding: Sequence[float], scope: str, corpus_version: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload of the most similar live entry in `scope`, or None."""
+        if not self.max_entries or embedding is None:
+            return None
+        query = _normalise(embedding)
+        now = time.time()
+        with self._lock:
+            best_key, best_sim = None, self.threshold
+            expired = []
+            for key, entry in self._entries.items():
+                if now - entry["created_at"] > self.ttl:
+                    expired.append(key)
+                    continue
+                if entry["scope"] != scope:
+                    continue
+                if entry["corpus_version"] != corpus_version:
+                    expired.append(key)
+                    continue
+                sim = sum(a * b for a, b in zip(query, entry["embedding"]))
+                if sim >= best_sim:
+                    best_key, best_sim = key, sim
+            for key in expired:
+                del self._entries[key]
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            return dict(self._entries[best_key]["payload"])
+
+    def put(self, query: str, embedding: Sequence[float], scope: str, corpus_version: str, payload: Dict[str, Any]) -> None:
+        """Store `payload` for `query`, evicting least recently used entries beyond the cap."""
+        if not self.max_entries or embedding is None:
+            return
+        key = f"{scope}\x00{' '.join(query.lower().split())}"
+        with self._lock:
+            self._entries[key] = {
+                "key": key,
+                "scope": scope,
+                "corpus_version": corpus_version,
+                "embedding": _normalise(embedding),
+                "created_at": time.time(),
+                "payload": payload,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+
+_cache: Optional[SemanticAnswerCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticAnswerCache()
+    return _cache
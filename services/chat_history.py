@@ -12,17 +12,21 @@ from pathlib import Path
 from typing import Dict, List, Optional
 
 from config import CHAT_HISTORY_FILE
-try:
-    # Lazy import to avoid hard dependency during environments without chroma
-    from rag.chat_history_store import get_chat_history_store
-    _CHAT_STORE = get_chat_history_store()
-except Exception:
-    _CHAT_STORE = None
 
 CHAT_PATH = Path(CHAT_HISTORY_FILE)
 CHAT_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
+def _chat_store():
+    """Vector store for chat messages, created on first use (None without chroma)."""
+    try:
+        from rag.chat_history_store import get_chat_history_store
+
+        return get_chat_history_store()
+    except Exception:
+        return None
+
+
 def _load() -> Dict[str, Dict]:
     if not CHAT_PATH.exists():
         return {}
@@ -85,15 +89,25 @@ def append_message(session_id: str, role: str, text: str) -> None:
     if role == "user" and len(chats[session_id]["messages"]) == 1:
         chats[session_id]["title"] = text[:48] + ("..." if len(text) > 48 else "")
     _save(chats)
-    # Also persist message to vector store for live retrieval (best-effort)
+    # Also queue the message for the vector store's background writer (best-effort)
     try:
-        if _CHAT_STORE is not None:
-            _CHAT_STORE.add_message(session_id=session_id, role=role, text=text)
+        store = _chat_store()
+        if store is not None:
+            idx = len(chats[session_id]["messages"]) - 1
+            store.add_message(session_id=session_id, role=role, text=text, idx=idx)
     except Exception:
         # Do not let vector store failures break chat persistence
         pass
 
 
+def sync_vector_index() -> int:
+    """Index chat messages not yet in the vector store. Returns how many were added."""
+    store = _chat_store()
+    if store is None:
+        return 0
+    return store.sync_from_file(CHAT_PATH)
+
+
 def ensure_session(session_id: Optional[str], fallback_title: str) -> str:
     if session_id and get_session(session_id):
         return session_id
@@ -0,0 +1,226 @@
+"""
+services/conversation_memory.py
+Token-budgeted conversation history for chat turns.
+
+Sending a session's whole message list on every turn makes prompt length (and
+Ollama prompt-eval time) grow with the conversation. `build_history` instead
+packs, within HISTORY_TOKEN_BUDGET:
+  - the last HISTORY_RECENT_TURNS turns verbatim,
+  - a rolling summary of the older part of the session,
+  - up to HISTORY_RELEVANT_MESSAGES older messages that share terms with the
+    new question, verbatim.
+Summaries are cached per session in HISTORY_SUMMARY_FILE and extended
+incrementally by a background LLM call once enough messages have aged out of
+the recent window, so a turn never waits on summarisation.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import (
+    HISTORY_RECENT_TURNS,
+    HISTORY_RELEVANT_MESSAGES,
+    HISTORY_SUMMARY_FILE,
+    HISTORY_SUMMARY_TOKENS,
+    HISTORY_TOKEN_BUDGET,
+)
+from rag.bm25_index import tokenize
+from rag.context_builder import estimate_tokens
+
+# Summarise only once this many messages have aged out since the last update
+_SUMMARY_MIN_NEW = 4
+# ...and fold at most this many per update, so a long legacy session catches up over several turns
+_SUMMARY_MAX_BATCH = 24
+# Long messages are clipped before they go into the summary prompt
+_SUMMARY_MESSAGE_CHARS = 2000
+
+_SUMMARY_SYS_PROMPT = (
+    "You maintain a running summary of a conversation between a user and a legal assistant. "
+    "Keep facts, names, dates, amounts, documents requested, decisions and open questions. "
+    "Write plain prose, no preamble."
+)
+
+
+def _text(message: Dict[str, Any]) -> str:
+    return message.get("text") or message.get("content") or ""
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        recent_turns: int = HISTORY_RECENT_TURNS,
+        relevant_messages: int = HISTORY_RELEVANT_MESSAGES,
+        summary_tokens: int = HISTORY_SUMMARY_TOKENS,
+    ) -> None:
+        self.path = Path(path or HISTORY_SUMMARY_FILE)
+        self.token_budget = token_budget
+        self.recent_messages = max(1, recent_turns) * 2
+        self.relevant_messages = max(0, relevant_messages)
+        self.summary_tokens = summary_tokens
+        self._lock = threading.Lock()
+        self._running: set = set()
+        # session_id -> {summary, upto, updated_at}; `summary` covers messages[:upto]
+        self._summaries: Dict[str, Dict[str, Any]] = self._load()
+
+    # ------------------------------------------------------------------ #
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        return payload if isinstance(payload, dict) else {}
+
+    def _save(self) -> None:
+        """Persist summaries; caller holds the lock."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                json.dump(self._summaries, fh, ensure_ascii=False)
+            tmp.replace(self.path)
+        except OSError:
+            pass
+
+    def summary_for(self, session_id: str, message_count: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._summaries.get(session_id)
+        # A summary past the end of the session belongs to a rewritten history
+        if not entry or entry.get("upto", 0) > message_count:
+            return None
+        return entry
+
+    # ------------------------------------------------------------------ #
+    def _relevant(self, candidates: List[Dict[str, Any]], question: str) -> List[int]:
+        """Indices into `candidates` sharing terms with `question`, best first."""
+        query_terms = set(tokenize(question))
+        if not query_terms or not self.relevant_messages:
+            return []
+        term_sets = [set(tokenize(_text(m))) for m in candidates]
+        df: Dict[str, int] = {}
+        for terms in term_sets:
+            for term in terms & query_terms:
+                df[term] = df.get(term, 0) + 1
+        n = len(candidates)
+        # Terms found in more than a quarter of the messages ("about", "please") do not discriminate
+        distinctive = {t for t, count in df.items() if count * 4 <= max(n, 4)}
+        scored = []
+        for i, terms in enumerate(term_sets):
+            score = sum(math.log(1 + n / df[t]) for t in terms & distinctive)
+            if score > 0:
+                scored.append((score, i))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return [i for _, i in scored[: self.relevant_messages]]
+
+    def build_history(self, session_id: Optional[str], messages: List[Dict[str, Any]], question: str) -> List[Dict[str, str]]:
+        """Return the history to send with `question`, oldest first, within the token budget."""
+        messages = [m for m in messages or [] if _text(m)]
+        budget = self.token_budget
+
+        # Recent turns, newest first until the window or the budget runs out
+        recent: List[Dict[str, Any]] = []
+        for message in reversed(messages[-self.recent_messages :]):
+            cost = estimate_tokens(_text(message))
+            if cost > budget:
+                break
+            recent.append(message)
+            budget -= cost
+        recent.reverse()
+        older = messages[: len(messages) - len(recent)]
+        if not older:
+            return [{"role": m.get("role", ""), "content": _text(m)} for m in recent]
+
+        head: List[Dict[str, str]] = []
+        entry = self.summary_for(session_id, len(messages)) if session_id else None
+        if entry and entry.get("summary"):
+            summary_text = f"Summary of the earlier conversation: {entry['summary']}"
+            cost = estimate_tokens(summary_text)
+            if cost <= budget:
+                head.append({"role": "system", "content": summary_text})
+                budget -= cost
+
+        picked = []
+        for i in self._relevant(older, question):
+            cost = estimate_tokens(_text(older[i]))
+            if cost <= budget:
+                picked.append(i)
+                budget -= cost
+        head.extend({"role": older[i].get("role", ""), "content": _text(older[i])} for i in sorted(picked))
+
+        if session_id:
+            self._maybe_summarise(session_id, older)
+        return head + [{"role": m.get("role", ""), "content": _text(m)} for m in recent]
+
+    # ------------------------------------------------------------------ #
+    def _maybe_summarise(self, session_id: str, older: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            entry = self._summaries.get(session_id) or {}
+            upto = entry.get("upto", 0)
+            if upto > len(older):
+                entry, upto = {}, 0
+            if len(older) - upto < _SUMMARY_MIN_NEW or session_id in self._running:
+                return
+            self._running.add(session_id)
+        threading.Thread(
+            target=self._summarise,
+            args=(session_id, entry.get("summary", ""), upto, list(older)),
+            name="history-summary",
+            daemon=True,
+        ).start()
+
+    def _summarise(self, session_id: str, previous: str, upto: int, older: List[Dict[str, Any]]) -> None:
+        from services.ollama_client import PRIORITY_BACKGROUND
+        from services.ollama_services import llm_chat
+
+        try:
+            batch = older[upto : upto + _SUMMARY_MAX_BATCH]
+            lines = [f"{m.get('role', '').upper()}: {_text(m)[:_SUMMARY_MESSAGE_CHARS]}" for m in batch]
+            prompt = (
+                f"Current summary:\n{previous or '(none)'}\n\n"
+                "New messages:\n" + "\n".join(lines) + "\n\n"
+                f"Return the updated summary in at most {self.summary_tokens * 3 // 4} words."
+            )
+            summary = llm_chat(
+                _SUMMARY_SYS_PROMPT,
+                prompt,
+                max_tokens=self.summary_tokens,
+                priority=PRIORITY_BACKGROUND,
+                # CLI fallback output may be an error message; fail so `upto` stays put
+                raise_on_fallback=True,
+            ).strip()
+            if summary:
+                with self._lock:
+                    self._summaries[session_id] = {"summary": summary, "upto": upto + len(batch), "updated_at": time.time()}
+                    self._save()
+        except Exception:
+            # Summaries are an optimisation; the next turn retries
+            pass
+        finally:
+            with self._lock:
+                self._running.discard(session_id)
+
+
+_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = ConversationMemory()
+    return _memory
+
+
+def build_history(session_id: Optional[str], messages: List[Dict[str, Any]], question: str) -> List[Dict[str, str]]:
+    return get_conversation_memory().build_history(session_id, messages, question)
@@ -7,28 +7,8 @@ import os
 from io import BytesIO
 from typing import Dict, List, Any, Optional, Union
 
-# Third-party imports
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle, Image as RLImage
-from reportlab.lib import colors
-from reportlab.pdfgen import canvas
-
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from docx.oxml import OxmlElement
-
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
-
-from pptx import Presentation
-from pptx.util import Inches as PPTXInches, Pt as PPTPt
-from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
-from pptx.dml.color import RGBColor as PPTXRGBColor
+# Format libraries (reportlab, python-docx, openpyxl, python-pptx) are imported
+# inside their generator, so a process only loads the ones it actually renders.
 
 from utils.file_utils import (
     ensure_generated_dir,
@@ -53,6 +33,12 @@ def _generate_pdf(title: str, content: List[Dict[str, Any]]) -> str:
     Returns:
         Absolute path to generated PDF
     """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+
     filename = generate_unique_filename("pdf")
     filepath = get_full_document_path(filename)
     
@@ -187,6 +173,10 @@ def _generate_docx(title: str, content: List[Dict[str, Any]]) -> str:
     Returns:
         Absolute path to generated DOCX
     """
+    from docx import Document
+    from docx.shared import Pt, Inches
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
     filename = generate_unique_filename("docx")
     filepath = get_full_document_path(filename)
     
@@ -292,6 +282,10 @@ def _generate_xlsx(title: str, content: List[Dict[str, Any]]) -> str:
     Returns:
         Absolute path to generated XLSX
     """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
     filename = generate_unique_filename("xlsx")
     filepath = get_full_document_path(filename)
     
@@ -406,6 +400,10 @@ def _generate_pptx(title: str, content: List[Dict[str, Any]]) -> str:
     Returns:
         Absolute path to generated PPTX
     """
+    from pptx import Presentation
+    from pptx.util import Inches as PPTXInches, Pt as PPTPt
+    from pptx.dml.color import RGBColor as PPTXRGBColor
+
     filename = generate_unique_filename("pptx")
     filepath = get_full_document_path(filename)
     
@@ -0,0 +1,153 @@
+"""
+services/ingest_jobs.py
+Background ingestion jobs for uploaded documents.
+
+`/api/upload` saves the files and hands them to `submit_job`, which returns a
+job id straight away. A bounded pool of workers extracts and chunks the files
+in parallel, while every Chroma write (embedding + upsert) goes through a
+single writer thread so concurrent jobs never contend on the collection.
+Per-file progress is kept in memory and exposed through `get_job` and
+`iter_job_events` (used by the status and SSE routes).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import INGEST_JOB_HISTORY, INGEST_WORKERS
+
+# Job states once every file has finished; "partial" means some files failed
+FINAL_STATES = ("completed", "partial", "failed")
+
+# Extraction/chunking workers and the single Chroma writer
+_WORKERS = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_WRITER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+
+_JOBS: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_JOBS_COND = threading.Condition()
+
+
+def _touch(job: Dict[str, Any]) -> None:
+    """Bump a job's version and wake SSE listeners. Caller holds _JOBS_COND."""
+    job["version"] += 1
+    job["updated_at"] = time.time()
+    _JOBS_COND.notify_all()
+
+
+def _update_file(job_id: str, index: int, **fields: Any) -> None:
+    with _JOBS_COND:
+        job = _JOBS.get(job_id)
+        if job is None:
+            return
+        job["files"][index].update(fields)
+        states = {f["status"] for f in job["files"]}
+        if states <= {"completed", "failed"}:
+            if states == {"completed"}:
+                job["status"] = "completed"
+            else:
+                job["status"] = "failed" if states == {"failed"} else "partial"
+        elif "running" in states or "completed" in states or "failed" in states:
+            job["status"] = "running"
+        _touch(job)
+
+
+def _evict_old_jobs() -> None:
+    """Drop the oldest finished jobs beyond INGEST_JOB_HISTORY. Caller holds _JOBS_COND."""
+    finished = [jid for jid, job in _JOBS.items() if job["status"] in FINAL_STATES]
+    for jid in finished[: max(0, len(_JOBS) - INGEST_JOB_HISTORY)]:
+        del _JOBS[jid]
+
+
+def _serialized_write(vdb, batch: List[Dict], persist_lexical: bool = True) -> int:
+    """Run `vdb.add` on the single writer thread and wait for it."""
+    return _WRITER.submit(vdb.add, batch, persist_lexical=persist_lexical).result()
+
+
+def _run_file(job_id: str, index: int, path: Path, vdb, session_id: Optional[str]) -> None:
+    _update_file(job_id, index, status="running")
+
+    def _progress(counts: Dict[str, int]) -> None:
+        _update_file(job_id, index, **counts)
+
+    try:
+        out = vdb.process_and_embed_document(
+            path,
+            session_id=session_id,
+            progress=_progress,
+            write=lambda batch, persist_lexical=True: _serialized_write(vdb, batch, persist_lexical),
+        )
+        _update_file(
+            job_id,
+            index,
+            status="completed",
+            inserted_chunks=out.get("inserted_chunks", 0),
+            new_chunks=out.get("new_chunks", 0),
+        )
+    except Exception as e:
+        _update_file(job_id, index, status="failed", error=str(e))
+
+
+# ---------------------------------------------------------------------- #
+def submit_job(paths: List[Path], vdb, session_id: Optional[str] = None) -> str:
+    """Queue `paths` for ingestion into `vdb` and return the new job id."""
+    job_id = uuid.uuid4().hex[:12]
+    now = time.time()
+    job = {
+        "job_id": job_id,
+        "status": "queued",
+        "session_id": session_id,
+        "created_at": now,
+        "updated_at": now,
+        "version": 0,
+        "files": [
+            {"file": Path(p).name, "status": "queued", "pages": 0, "inserted_chunks": 0, "new_chunks": 0}
+            for p in paths
+        ],
+    }
+    with _JOBS_COND:
+        _JOBS[job_id] = job
+        _evict_old_jobs()
+    for index, path in enumerate(paths):
+        _WORKERS.submit(_run_file, job_id, index, Path(path), vdb, session_id)
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return a snapshot of the job, or None if unknown."""
+    with _JOBS_COND:
+        job = _JOBS.get(job_id)
+        if job is None:
+            return None
+        return {**job, "files": [dict(f) for f in job["files"]]}
+
+
+def iter_job_events(job_id: str, keepalive: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield a job snapshot each time it changes, ending once the job finishes.
+
+    Yields None when `keepalive` seconds pass without a change so SSE callers
+    can send a keep-alive comment.
+    """
+    last_version = -1
+    while True:
+        with _JOBS_COND:
+            job = _JOBS.get(job_id)
+            if job is not None and job["version"] == last_version:
+                _JOBS_COND.wait(timeout=keepalive)
+                job = _JOBS.get(job_id)
+            if job is None:
+                return
+            changed = job["version"] != last_version
+            last_version = job["version"]
+            snapshot = {**job, "files": [dict(f) for f in job["files"]]}
+        if not changed:
+            yield None
+            continue
+        yield snapshot
+        if snapshot["status"] in FINAL_STATES:
+            return
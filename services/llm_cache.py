@@ -0,0 +1,162 @@
+"""
+services/llm_cache.py
+Exact-match cache for LLM responses.
+
+The planner, field discovery, evaluator and explain prompts run at low
+temperature on highly repetitive inputs, so the same request often comes
+back; those call sites opt in with `llm_chat(..., use_cache=True)`. Responses
+are keyed by a hash of (model, messages, temperature, max_tokens); calls above
+LLM_CACHE_MAX_TEMPERATURE bypass the cache since their output is meant to
+vary, and entries expire after LLM_CACHE_TTL seconds. The cache is LRU-bounded
+to LLM_CACHE_SIZE entries and persisted to LLM_CACHE_FILE so restarts keep it
+warm: each insert appends one JSON line, and the file is rewritten only once
+it holds twice as many lines as the cache has entries.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import LLM_CACHE_FILE, LLM_CACHE_MAX_TEMPERATURE, LLM_CACHE_SIZE, LLM_CACHE_TTL
+
+
+def request_key(model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    raw = json.dumps(
+        {"model": model, "messages": messages, "temperature": float(temperature), "max_tokens": int(max_tokens)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: int = LLM_CACHE_SIZE,
+        max_temperature: float = LLM_CACHE_MAX_TEMPERATURE,
+        ttl: float = LLM_CACHE_TTL,
+    ) -> None:
+        self.path = Path(path or LLM_CACHE_FILE)
+        self.max_entries = max(0, max_entries)
+        self.max_temperature = max_temperature
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Lines in the journal file, live or superseded
+        self._lines = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    # ------------------------------------------------------------------ #
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        now = time.time()
+        try:
+            with self.path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    self._lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line from an interrupted write
+                    if "key" not in entry or "response" not in entry:
+                        continue
+                    if now - entry.get("created_at", 0) > self.ttl:
+                        self._entries.pop(entry["key"], None)
+                        continue
+                    self._entries[entry["key"]] = entry
+                    self._entries.move_to_end(entry["key"])
+        except OSError:
+            return
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        """Journal one new entry, compacting the file once it is mostly dead lines; caller holds the lock."""
+        if self._lines >= 2 * max(self.max_entries, 1):
+            self._save()
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._lines += 1
+        except OSError:
+            pass
+
+    def _save(self) -> None:
+        """Rewrite the file with the live entries in LRU order; caller holds the lock."""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            with tmp.open("w", encoding="utf-8") as fh:
+                for entry in self._entries.values():
+                    fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            tmp.replace(self.path)
+            self._lines = len(self._entries)
+        except OSError:
+            pass
+
+    def cacheable(self, temperature: float) -> bool:
+        return bool(self.max_entries) and temperature <= self.max_temperature
+
+    # ------------------------------------------------------------------ #
+    def get(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> Optional[str]:
+        """Return the cached response for this exact request, or None."""
+        if not self.cacheable(temperature):
+            return None
+        key = request_key(model, messages, temperature, max_tokens)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry["created_at"] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry["response"]
+
+    def put(self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int, response: str) -> None:
+        """Store `response`, evicting least recently used entries beyond the cap."""
+        if not self.cacheable(temperature) or not response:
+            return
+        key = request_key(model, messages, temperature, max_tokens)
+        with self._lock:
+            entry = {"key": key, "model": model, "created_at": time.time(), "response": response}
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._append(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+    return _cache
@@ -0,0 +1,187 @@
+"""
+services/ollama_client.py
+Shared HTTP connection pool for the Ollama API.
+
+All LLM calls go through one keep-alive `requests.Session`, so an agent run
+(planner, field discovery, evaluator) reuses warm connections instead of
+opening a new TCP connection per call. The pool holds at most OLLAMA_POOL_SIZE
+connections and blocks further callers until one is free, which also caps
+concurrent requests to the model server. Connect and read timeouts are
+separate, and requests that fail to connect or whose pooled connection was
+reset are retried OLLAMA_RETRIES times (read timeouts are not retried: the
+model may still be generating).
+
+In front of the pool sits a priority-aware limiter: at most
+OLLAMA_MAX_CONCURRENCY calls run against Ollama at once, and when a slot frees
+up it goes to the oldest waiting "interactive" call (chat) before any
+"background" call (agent planning, field discovery, evaluation). Queue depth,
+wait times and throughput per class are reported by `limiter_stats()`.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import (
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_HOST,
+    OLLAMA_MAX_CONCURRENCY,
+    OLLAMA_POOL_SIZE,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_RETRIES,
+)
+
+# Base delay between retries; doubled on each attempt
+_RETRY_BACKOFF = 0.2
+
+# Priority classes, most urgent first
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+_PRIORITY_RANK = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 1}
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_ollama_session() -> requests.Session:
+    """Return the process-wide pooled session for OLLAMA_HOST."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE, pool_block=True)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def ollama_post(path: str, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+    """POST `payload` to `path` on OLLAMA_HOST and return the (successful) response.
+
+    Streaming callers must close the response (or exhaust it) to hand the
+    connection back to the pool.
+    """
+    url = f"{OLLAMA_HOST.rstrip('/')}/{path.lstrip('/')}"
+    for attempt in range(OLLAMA_RETRIES + 1):
+        try:
+            response = get_ollama_session().post(
+                url,
+                json=payload,
+                stream=stream,
+                timeout=(OLLAMA_CONNECT_TIMEOUT, OLLAMA_READ_TIMEOUT),
+            )
+        except requests.ConnectionError:
+            # Refused/reset connections (e.g. a pooled socket closed by the server)
+            if attempt == OLLAMA_RETRIES:
+                raise
+            time.sleep(_RETRY_BACKOFF * (2 ** attempt))
+            continue
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+    raise RuntimeError("unreachable")
+
+
+# ---------------------------------------------------------------------- #
+# Concurrency limiter
+# ---------------------------------------------------------------------- #
+class PriorityLimiter:
+    """Counting semaphore that hands free slots out by priority, then FIFO."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, int(limit))
+        self._cond = threading.Condition()
+        self._active = 0
+        self._queue: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._stats = {
+            name: {"waiting": 0, "max_waiting": 0, "served": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for name in _PRIORITY_RANK
+        }
+
+    def acquire(self, priority: str = PRIORITY_INTERACTIVE) -> None:
+        if priority not in _PRIORITY_RANK:
+            raise ValueError(f"unknown priority class: {priority!r}")
+        stats = self._stats[priority]
+        started = time.monotonic()
+        with self._cond:
+            ticket = (_PRIORITY_RANK[priority], next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            stats["waiting"] += 1
+            stats["max_waiting"] = max(stats["max_waiting"], stats["waiting"])
+            while self._active >= self.limit or self._queue[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._queue)
+            self._active += 1
+            waited = time.monotonic() - started
+            stats["waiting"] -= 1
+            stats["served"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+            # The next ticket in line may be able to take another free slot
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = PRIORITY_INTERACTIVE) -> Iterator[None]:
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            classes = {}
+            for name, stats in self._stats.items():
+                served = stats["served"]
+                classes[name] = {
+                    "waiting": stats["waiting"],
+                    "max_waiting": stats["max_waiting"],
+                    "served": served,
+                    "avg_wait_ms": round(stats["wait_seconds"] / served * 1000, 1) if served else 0.0,
+                    "max_wait_ms": round(stats["max_wait_seconds"] * 1000, 1),
+                }
+            return {
+                "limit": self.limit,
+                "in_flight": self._active,
+                "queue_depth": len(self._queue),
+                "classes": classes,
+            }
+
+
+_limiter: Optional[PriorityLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_ollama_limiter() -> PriorityLimiter:
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = PriorityLimiter(OLLAMA_MAX_CONCURRENCY)
+    return _limiter
+
+
+def ollama_slot(priority: str = PRIORITY_INTERACTIVE):
+    """Context manager holding one of the OLLAMA_MAX_CONCURRENCY model slots."""
+    return get_ollama_limiter().slot(priority)
+
+
+def limiter_stats() -> Dict[str, Any]:
+    return get_ollama_limiter().stats()
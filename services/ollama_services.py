@@ -7,16 +7,18 @@ from __future__ import annotations
 
 import json
 import subprocess
-from typing import Dict, List, Optional
-
-import requests
+from typing import Callable, Dict, List, Optional, Tuple
 
 from config import (
+    ANSWER_CACHE_ENABLED,
     DEFAULT_CHAT_SYSTEM_PROMPT,
-    OLLAMA_HOST,
+    LLM_CACHE_ENABLED,
     OLLAMA_MODEL,
 )
-from rag.rag_pipeline import get_relevant_context
+from rag.rag_pipeline import corpus_version, embed_query, get_relevant_context
+from services.answer_cache import get_answer_cache
+from services.llm_cache import get_llm_cache
+from services.ollama_client import PRIORITY_INTERACTIVE, ollama_post, ollama_slot
 
 
 def _normalise_history(history: Optional[List[Dict[str, str]]]) -> List[Dict[str, str]]:
@@ -58,11 +60,8 @@ def _chat_via_http(
             "num_predict": max_tokens,
         },
     }
-    response = requests.post(
-        f"{OLLAMA_HOST.rstrip('/')}/api/chat", json=payload, timeout=120
-    )
-    response.raise_for_status()
-    data = response.json()
+    with ollama_post("/api/chat", payload) as response:
+        data = response.json()
     if isinstance(data, dict) and "message" in data:
         return data["message"]["content"]
     # When streaming is disabled, Ollama still returns a dict with `message`.
@@ -85,19 +84,62 @@ def _chat_via_cli(messages: List[Dict[str, str]]) -> str:
     return result.stdout.strip() or result.stderr.strip()
 
 
+def _llm_chat(
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+    priority: str,
+    use_cache: bool = False,
+    validate: Optional[Callable[[str], bool]] = None,
+    raise_on_fallback: bool = False,
+) -> Tuple[str, bool]:
+    """Run one chat completion; returns (text, from_http).
+
+    `from_http` is False when the answer came from the CLI fallback, whose
+    output may be an error message; callers must not cache such answers.
+    With `raise_on_fallback` the HTTP error is raised instead.
+    """
+    cache = get_llm_cache() if LLM_CACHE_ENABLED and use_cache else None
+    if cache is not None:
+        cached = cache.get(OLLAMA_MODEL, messages, temperature, max_tokens)
+        if cached is not None and (validate is None or validate(cached)):
+            return cached, True
+    with ollama_slot(priority):
+        try:
+            answer = _chat_via_http(messages, temperature, max_tokens)
+        except Exception:
+            if raise_on_fallback:
+                raise
+            return _chat_via_cli(messages), False
+    if cache is not None and (validate is None or validate(answer)):
+        cache.put(OLLAMA_MODEL, messages, temperature, max_tokens, answer)
+    return answer, True
+
+
 def llm_chat(
     system_prompt: Optional[str],
     user_prompt: str,
     history: Optional[List[Dict[str, str]]] = None,
     temperature: float = 0.15,
     max_tokens: int = 768,
+    priority: str = PRIORITY_INTERACTIVE,
+    use_cache: bool = False,
+    validate: Optional[Callable[[str], bool]] = None,
+    raise_on_fallback: bool = False,
 ) -> str:
-    """General-purpose chat helper with graceful HTTP/CLI fallback."""
+    """General-purpose chat helper with graceful HTTP/CLI fallback.
+
+    `priority` is the limiter class: "interactive" for user-facing calls,
+    "background" for agent work that can wait. With `use_cache=True`,
+    low-temperature responses are served from the LLM cache when the exact
+    request was seen before; only deterministic agent prompts opt in, since
+    the cache knows nothing about corpus or conversation changes. `validate`
+    restricts caching (and reuse) to answers it accepts. Callers that
+    store the answer can set `raise_on_fallback` to get an exception rather
+    than CLI output, which may be an error message.
+    """
     messages = _build_messages(system_prompt, user_prompt, history)
-    try:
-        return _chat_via_http(messages, temperature, max_tokens)
-    except Exception:
-        return _chat_via_cli(messages)
+    return _llm_chat(messages, temperature, max_tokens, priority, use_cache, validate, raise_on_fallback)[0]
 
 
 def stream_llm_chat(
@@ -106,11 +148,13 @@ def stream_llm_chat(
     history: Optional[List[Dict[str, str]]] = None,
     temperature: float = 0.15,
     max_tokens: int = 768,
+    priority: str = PRIORITY_INTERACTIVE,
 ):
     """Stream tokens from the Ollama HTTP API as a generator of text chunks.
 
     Yields decoded text chunks (strings). The caller can accumulate them
-    to form the final assistant output.
+    to form the final assistant output. A model slot is held until the
+    stream is exhausted or closed.
     """
     messages = _build_messages(system_prompt, user_prompt, history)
     payload = {
@@ -123,38 +167,49 @@ def stream_llm_chat(
         },
     }
 
-    resp = requests.post(
-        f"{OLLAMA_HOST.rstrip('/')}/api/chat", json=payload, stream=True, timeout=120
-    )
-    resp.raise_for_status()
+    with ollama_slot(priority):
+        resp = ollama_post("/api/chat", payload, stream=True)
+        try:
+            yield from _iter_stream_tokens(resp)
+        finally:
+            # Hand the pooled connection back even if the consumer stops early
+            resp.close()
 
-    # Ollama returns a chunked/ndjson-like stream. Iterate lines and try to
-    # extract sensible text for each line; fall back to raw line text.
+
+def _iter_stream_tokens(resp):
+    # Ollama returns NDJSON: one object per line, the last one with "done": true.
+    # Non-empty text is yielded; lines that are not JSON objects pass through as-is.
+    # Errors reported in the stream, and streams that stop before "done", raise,
+    # so callers only ever save or cache complete answers.
+    done = False
     for line in resp.iter_lines(decode_unicode=True):
         if not line:
             continue
-        token = None
         try:
             data = json.loads(line)
-            # flexible extraction depending on Ollama's streaming format
-            if isinstance(data, dict):
-                if "text" in data and data["text"]:
-                    token = data["text"]
-                elif "message" in data and isinstance(data["message"], dict):
-                    msg = data["message"]
-                    # message.content may be a string or structure
-                    if isinstance(msg.get("content"), str):
-                        token = msg.get("content")
-                    else:
-                        token = json.dumps(msg.get("content", ""))
-        except Exception:
-            # Not JSON or unexpected shape — use the raw line
-            token = None
-
-        if token is None:
-            token = line
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            yield line
+            continue
+        if data.get("error"):
+            raise RuntimeError(f"Ollama stream error: {data['error']}")
 
-        yield token
+        token = None
+        # flexible extraction depending on Ollama's streaming format
+        if data.get("text"):
+            token = data["text"]
+        elif isinstance(data.get("message"), dict):
+            # message.content may be a string or structure
+            content = data["message"].get("content", "")
+            token = content if isinstance(content, str) else json.dumps(content)
+        if token:
+            yield token
+        if data.get("done"):
+            done = True
+            break
+    if not done:
+        raise RuntimeError("Ollama stream ended before completion")
 
 
 def query_ollama(prompt: str) -> str:
@@ -162,20 +217,14 @@ def query_ollama(prompt: str) -> str:
     return llm_chat(system_prompt=None, user_prompt=prompt)
 
 
-def query_ollama_with_rag(user_query: str, top_k: int = 3, session_id: str | None = None) -> dict:
-    """
-    Uses the RAG pipeline to ground the response in legal context.
-    Returns the answer and the snippets that were supplied to the model.
-    """
-    context_docs = get_relevant_context(user_query, top_k=top_k, session_id=session_id)
-
+def _rag_prompt(user_query: str, context_docs: List[Dict]) -> str:
     if context_docs:
         # Build a numbered context block with short snippets
         context_text = "\n\n".join([f"[{d['id']}] {d['title']}\n{d['snippet']}" for d in context_docs])
     else:
         context_text = "No relevant context found."
 
-    prompt = (
+    return (
         "You are an expert legal assistant. Use ONLY the provided Indian legal context to answer the user's question. "
         "When you use a document, cite it by its numeric id in square brackets (e.g. [1]). "
         "If the context is insufficient to answer, say explicitly which information is missing. "
@@ -183,9 +232,85 @@ def query_ollama_with_rag(user_query: str, top_k: int = 3, session_id: str | Non
         f"Context:\n{context_text}\n\nQuestion:\n{user_query}\n\nAnswer:"
     )
 
-    answer = llm_chat(DEFAULT_CHAT_SYSTEM_PROMPT, prompt)
-    return {
+
+def query_ollama_with_rag(user_query: str, top_k: int = 3, session_id: str | None = None) -> dict:
+    """
+    Uses the RAG pipeline to ground the response in legal context.
+    Returns the answer and the snippets that were supplied to the model.
+
+    Answers are served from the semantic answer cache when a sufficiently
+    similar question was answered before against the same corpus version.
+    """
+    cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+    scope = f"{session_id or ''}:{top_k}"
+    query_embedding = None
+    version = ""
+    if cache is not None:
+        try:
+            query_embedding = embed_query(user_query)
+            version = corpus_version(session_id)
+            cached = cache.get(query_embedding, scope, version)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return {**cached, "question": user_query, "cached": True}
+
+    context_docs = get_relevant_context(user_query, top_k=top_k, session_id=session_id)
+    messages = _build_messages(DEFAULT_CHAT_SYSTEM_PROMPT, _rag_prompt(user_query, context_docs), None)
+    answer, from_http = _llm_chat(messages, 0.15, 768, PRIORITY_INTERACTIVE)
+    result = {
         "question": user_query,
         "answer": answer,
         "context": context_docs,
     }
+    # CLI fallback output may be an error message; keep it out of the cache
+    if cache is not None and query_embedding is not None and answer and from_http:
+        try:
+            cache.put(user_query, query_embedding, scope, version, result)
+        except Exception:
+            pass
+    return {**result, "cached": False}
+
+
+def stream_query_with_rag(user_query: str, top_k: int = 3, session_id: str | None = None) -> dict:
+    """Streaming counterpart of `query_ollama_with_rag`.
+
+    Retrieval runs up front; returns {"context": [...], "tokens": iterator,
+    "cached": bool}. Tokens are produced lazily, so callers can send the
+    sources before generation starts. A fully streamed answer is stored in the
+    semantic answer cache; an abandoned one is not.
+    """
+    cache = get_answer_cache() if ANSWER_CACHE_ENABLED else None
+    scope = f"{session_id or ''}:{top_k}"
+    query_embedding = None
+    version = ""
+    if cache is not None:
+        try:
+            query_embedding = embed_query(user_query)
+            version = corpus_version(session_id)
+            cached = cache.get(query_embedding, scope, version)
+        except Exception:
+            cached = None
+        if cached is not None:
+            return {"context": cached.get("context"), "tokens": (t for t in [cached.get("answer", "")]), "cached": True}
+
+    context_docs = get_relevant_context(user_query, top_k=top_k, session_id=session_id)
+    stream = stream_llm_chat(DEFAULT_CHAT_SYSTEM_PROMPT, _rag_prompt(user_query, context_docs))
+
+    def tokens():
+        parts = []
+        try:
+            for token in stream:
+                parts.append(token)
+                yield token
+        finally:
+            stream.close()
+        answer = "".join(parts)
+        if cache is not None and query_embedding is not None and answer:
+            try:
+                result = {"question": user_query, "answer": answer, "context": context_docs}
+                cache.put(user_query, query_embedding, scope, version, result)
+            except Exception:
+                pass
+
+    return {"context": context_docs, "tokens": tokens(), "cached": False}
@@ -0,0 +1,90 @@
+"""
+tests/conftest.py
+Shared fixtures: isolated data files and a deterministic stand-in embedding model.
+
+config.py reads its settings once at import, so the data-file settings are
+pointed at a temporary directory here, before any app module is imported.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from chromadb.api.types import EmbeddingFunction
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+_DATA = Path(tempfile.mkdtemp(prefix="lexigpt-tests-"))
+for _name, _value in {
+    "EMBED_CACHE_ENABLED": "0",
+    "EMBED_CACHE_DIR": _DATA / "embed_cache",
+    "ANSWER_CACHE_FILE": _DATA / "answer_cache.json",
+    "LLM_CACHE_FILE": _DATA / "llm_cache.json",
+    "BM25_INDEX_FILE": _DATA / "bm25_index.json",
+    "CHAT_HISTORY_FILE": _DATA / "chat_history.json",
+    "CHAT_INDEX_STATE_FILE": _DATA / "chat_index_state.json",
+    "HISTORY_SUMMARY_FILE": _DATA / "chat_summaries.json",
+    "VECTOR_DB_DIR": _DATA / "vectordb",
+    "OLLAMA_HOST": "http://127.0.0.1:9",
+}.items():
+    os.environ[_name] = str(_value)
+
+_DIM = 64
+
+
+class HashEmbedding(EmbeddingFunction):
+    """Bag-of-words hashing embedder: same text, same unit vector; no model download."""
+
+    def __init__(self) -> None:
+        pass
+
+    @staticmethod
+    def name() -> str:
+        # Chroma checks a reopened collection's function by name; match the app's default
+        return "default"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbedding()
+
+    def __call__(self, input):
+        out = []
+        for text in input:
+            vec = np.zeros(_DIM, dtype=np.float32)
+            for word in str(text).lower().split():
+                vec[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % _DIM] += 1.0
+            norm = np.linalg.norm(vec)
+            out.append(vec / norm if norm else vec)
+        return out
+
+
+@pytest.fixture
+def hash_embeddings(monkeypatch):
+    """Install HashEmbedding as the process-wide model in rag.chroma_registry."""
+    from rag import chroma_registry
+
+    embedder = HashEmbedding()
+    monkeypatch.setattr(chroma_registry, "_EMBEDDING_FN", embedder)
+    monkeypatch.setattr(chroma_registry, "_MODEL_EMBEDDER", embedder)
+    monkeypatch.setattr(chroma_registry, "_QUERY_EMBEDDER", None)
+    return embedder
+
+
+@pytest.fixture
+def chat_store(tmp_path, monkeypatch, hash_embeddings):
+    """A ChatHistoryStore with its own collection, state file and (empty) chat history."""
+    from rag import chat_history_store
+
+    monkeypatch.setattr(chat_history_store, "CHAT_INDEX_STATE_FILE", str(tmp_path / "chat_index_state.json"))
+    monkeypatch.setattr(chat_history_store, "CHAT_HISTORY_FILE", str(tmp_path / "chat_history.json"))
+    store = chat_history_store.ChatHistoryStore(persist_dir=tmp_path / "vectordb")
+    yield store
+    store.close()
@@ -0,0 +1,75 @@
+"""
+tests/test_answer_cache.py
+Semantic answer cache and its invalidation.
+"""
+
+import threading
+
+from rag.retriever import Retriever
+from services import ollama_services
+from services.answer_cache import SemanticAnswerCache
+
+EMB = [1.0, 0.0, 0.0]
+NEAR = [0.99, 0.05, 0.0]
+
+
+def test_serves_similar_questions_of_the_same_corpus_version(tmp_path):
+    cache = SemanticAnswerCache(tmp_path / "answers.json", threshold=0.95)
+    cache.put("What is the notice period?", EMB, "s1:3", "v1", {"answer": "30 days"})
+    assert cache.get(NEAR, "s1:3", "v1") == {"answer": "30 days"}
+    assert cache.get(NEAR, "s2:3", "v1") is None
+    assert cache.get([0.0, 1.0, 0.0], "s1:3", "v1") is None
+    # Entries of an older corpus version are dropped
+    assert cache.get(NEAR, "s1:3", "v2") is None
+    assert cache.get(NEAR, "s1:3", "v1") is None
+
+
+def test_load_trims_to_max_entries(tmp_path):
+    path = tmp_path / "answers.json"
+    cache = SemanticAnswerCache(path, max_entries=5)
+    for i in range(5):
+        cache.put(f"question {i}", [1.0, float(i), 0.0], "s:3", "v1", {"answer": str(i)})
+
+    smaller = SemanticAnswerCache(path, max_entries=2)
+    assert len(smaller._entries) == 2
+    assert [e["payload"]["answer"] for e in smaller._entries.values()] == ["3", "4"]
+
+
+def test_corpus_version_tracks_chat_history(chat_store):
+    class NoPartitions:
+        def revision(self, session_id):
+            return None
+
+    retriever = object.__new__(Retriever)
+    retriever.bm25 = None
+    retriever._vector_ready = threading.Event()
+    retriever.partitions = NoPartitions()
+    retriever.chat_store = chat_store
+
+    before = retriever.corpus_version("s1")
+    chat_store.add_message("s2", "user", "Is a verbal lease valid?", idx=0)
+    assert retriever.corpus_version("s1") == before  # queued, not yet searchable
+    chat_store.flush()
+    assert retriever.corpus_version("s1") != before
+
+
+def test_cli_fallback_answers_are_not_cached(tmp_path, monkeypatch):
+    cache = SemanticAnswerCache(tmp_path / "answers.json")
+    monkeypatch.setattr(ollama_services, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(ollama_services, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(ollama_services, "embed_query", lambda q: EMB)
+    monkeypatch.setattr(ollama_services, "corpus_version", lambda session_id=None: "v1")
+    monkeypatch.setattr(ollama_services, "get_relevant_context", lambda *a, **k: [])
+
+    def http_down(*args):
+        raise ConnectionError("refused")
+
+    monkeypatch.setattr(ollama_services, "_chat_via_http", http_down)
+    monkeypatch.setattr(ollama_services, "_chat_via_cli", lambda messages: "Error: could not connect to ollama app")
+    result = ollama_services.query_ollama_with_rag("What is the notice period?")
+    assert result["cached"] is False
+    assert cache.get(EMB, ":3", "v1") is None
+
+    monkeypatch.setattr(ollama_services, "_chat_via_http", lambda *args: "30 days [1]")
+    ollama_services.query_ollama_with_rag("What is the notice period?")
+    assert ollama_services.query_ollama_with_rag("What is the notice period?")["cached"] is True
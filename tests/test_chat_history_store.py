@@ -0,0 +1,67 @@
+"""
+tests/test_chat_history_store.py
+Write-behind indexing and incremental sync of chat history.
+"""
+
+import json
+
+
+def test_flush_indexes_queued_messages(chat_store, hash_embeddings):
+    chat_store.add_message("s1", "user", "Can my landlord keep the deposit?", idx=0)
+    chat_store.add_message("s1", "assistant", "Only for unpaid rent or damage.", idx=1)
+    assert chat_store.collection.count() == 0
+    assert chat_store.flush() == 2
+    assert chat_store._state["s1"]["idx"] == 1
+
+    query = "landlord deposit"
+    hits = chat_store.search(query, query_embedding=hash_embeddings([query])[0])
+    assert hits[0]["content"] == "Can my landlord keep the deposit?"
+
+
+def test_failed_flush_requeues_the_batch(chat_store):
+    chat_store.add_message("s1", "user", "first", idx=0)
+
+    def broken(items):
+        raise RuntimeError("embedding model unavailable")
+
+    chat_store._write_messages = broken
+    assert chat_store.flush() == 0
+    assert "s1" not in chat_store._state
+
+    chat_store.add_message("s1", "user", "second", idx=1)
+    del chat_store._write_messages
+    assert [m["content"] for m in chat_store._pending] == ["first", "second"]
+    assert chat_store.flush() == 2
+    assert chat_store._state["s1"]["idx"] == 1
+
+
+def _write_history(path, messages):
+    path.write_text(json.dumps({"s1": {"title": "Lease", "messages": messages}}), encoding="utf-8")
+
+
+def test_sync_only_indexes_new_messages(chat_store, tmp_path):
+    history = tmp_path / "chat_history.json"
+    messages = [{"role": "user", "text": "What is stamp duty?"}, {"role": "assistant", "text": "A tax on documents."}]
+    _write_history(history, messages)
+    assert chat_store.sync_from_file(history) == 2
+    assert chat_store.sync_from_file(history) == 0
+
+    messages.append({"role": "user", "text": "Who pays it on a lease?"})
+    _write_history(history, messages)
+    assert chat_store.sync_from_file(history) == 1
+    assert chat_store._state["s1"]["idx"] == 2
+    assert chat_store.collection.count() == 3
+
+
+def test_sync_rescans_an_edited_session(chat_store, tmp_path):
+    history = tmp_path / "chat_history.json"
+    messages = [{"role": "user", "text": "first question"}, {"role": "assistant", "text": "first answer"}]
+    _write_history(history, messages)
+    chat_store.sync_from_file(history)
+
+    # The marked (last indexed) message changed: the session is scanned again,
+    # and only the text not indexed before is embedded
+    messages[1]["text"] = "corrected answer"
+    _write_history(history, messages)
+    assert chat_store.sync_from_file(history) == 1
+    assert chat_store._state["s1"]["idx"] == 1
@@ -0,0 +1,107 @@
+"""
+tests/test_chat_stream.py
+Token streaming from Ollama and the SSE chat endpoint.
+"""
+
+import json
+
+import pytest
+from flask import Flask
+
+from routes import ollama_routes
+from services import chat_history, ollama_services
+from services.answer_cache import SemanticAnswerCache
+
+
+class FakeResponse:
+    def __init__(self, *objects):
+        self.lines = [o if isinstance(o, str) else json.dumps(o) for o in objects]
+
+    def iter_lines(self, decode_unicode=True):
+        return iter(self.lines)
+
+
+def chunk(text, done=False):
+    return {"message": {"role": "assistant", "content": text}, "done": done}
+
+
+def test_tokens_stop_at_done_without_empty_tokens():
+    resp = FakeResponse(chunk("Hel"), "", chunk("lo"), chunk("", done=True))
+    assert list(ollama_services._iter_stream_tokens(resp)) == ["Hel", "lo"]
+
+
+@pytest.mark.parametrize(
+    "tail, message",
+    [
+        ([{"error": "model 'llama3' not found"}], "Ollama stream error"),
+        ([], "ended before completion"),
+    ],
+)
+def test_errors_and_truncated_streams_raise(tail, message):
+    tokens = ollama_services._iter_stream_tokens(FakeResponse(chunk("Hel"), *tail))
+    assert next(tokens) == "Hel"
+    with pytest.raises(RuntimeError, match=message):
+        next(tokens)
+
+
+def _failing_stream(*args, **kwargs):
+    yield "Partial"
+    raise RuntimeError("Ollama stream error: model 'llama3' not found")
+
+
+def _good_stream(*args, **kwargs):
+    yield from ["Thirty ", "days."]
+
+
+def test_rag_stream_caches_only_complete_answers(tmp_path, monkeypatch):
+    cache = SemanticAnswerCache(tmp_path / "answers.json")
+    monkeypatch.setattr(ollama_services, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(ollama_services, "get_answer_cache", lambda: cache)
+    monkeypatch.setattr(ollama_services, "embed_query", lambda q: [1.0, 0.0])
+    monkeypatch.setattr(ollama_services, "corpus_version", lambda session_id=None: "v1")
+    monkeypatch.setattr(ollama_services, "get_relevant_context", lambda *a, **k: [])
+
+    monkeypatch.setattr(ollama_services, "stream_llm_chat", _failing_stream)
+    tokens = ollama_services.stream_query_with_rag("Notice period?")["tokens"]
+    with pytest.raises(RuntimeError):
+        list(tokens)
+    assert cache.get([1.0, 0.0], ":3", "v1") is None
+
+    monkeypatch.setattr(ollama_services, "stream_llm_chat", _good_stream)
+    assert "".join(ollama_services.stream_query_with_rag("Notice period?")["tokens"]) == "Thirty days."
+    assert cache.get([1.0, 0.0], ":3", "v1")["answer"] == "Thirty days."
+
+
+@pytest.fixture
+def client(monkeypatch):
+    saved = []
+    monkeypatch.setattr(chat_history, "get_session", lambda session_id: None)
+    monkeypatch.setattr(chat_history, "ensure_session", lambda session_id, title: "s1")
+    monkeypatch.setattr(chat_history, "append_message", lambda sid, role, text: saved.append((role, text)))
+    app = Flask(__name__)
+    app.register_blueprint(ollama_routes.bp)
+    test_client = app.test_client()
+    test_client.saved = saved
+    return test_client
+
+
+def _stream_events(client):
+    stream_id = client.post("/api/chat/stream", json={"message": "Notice period?"}).get_json()["stream_id"]
+    body = client.get(f"/api/chat/stream/{stream_id}").get_data(as_text=True)
+    return [json.loads(block[len("data: "):]) for block in body.split("\n\n") if block.startswith("data: ")]
+
+
+def test_stream_saves_complete_answer(client, monkeypatch):
+    monkeypatch.setattr(ollama_routes, "stream_llm_chat", _good_stream)
+    events = _stream_events(client)
+    assert [e["type"] for e in events] == ["token", "token", "done"]
+    assert events[-1]["response"] == "Thirty days."
+    assert client.saved == [("user", "Notice period?"), ("assistant", "Thirty days.")]
+
+
+def test_stream_error_is_generic_and_not_saved(client, monkeypatch):
+    monkeypatch.setattr(ollama_routes, "stream_llm_chat", _failing_stream)
+    events = _stream_events(client)
+    assert [e["type"] for e in events] == ["token", "error"]
+    assert "llama3" not in events[-1]["error"] and "RuntimeError" not in events[-1]["error"]
+    assert client.saved == [("user", "Notice period?")]
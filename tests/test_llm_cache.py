@@ -0,0 +1,74 @@
+"""
+tests/test_llm_cache.py
+Exact-match LLM response cache and its use by llm_chat.
+"""
+
+import json
+
+import pytest
+
+from services import llm_cache, ollama_services
+from services.llm_cache import LLMResponseCache
+
+MESSAGES = [{"role": "user", "content": "plan: draft a rent agreement"}]
+
+
+def test_entries_expire(tmp_path, monkeypatch):
+    cache = LLMResponseCache(tmp_path / "llm.jsonl", ttl=60)
+    cache.put("m", MESSAGES, 0.1, 64, "plan")
+    assert cache.get("m", MESSAGES, 0.1, 64) == "plan"
+
+    later = llm_cache.time.time() + 61
+    monkeypatch.setattr(llm_cache.time, "time", lambda: later)
+    assert cache.get("m", MESSAGES, 0.1, 64) is None
+    assert LLMResponseCache(tmp_path / "llm.jsonl", ttl=60).stats()["entries"] == 0
+
+
+def test_puts_append_and_compact(tmp_path):
+    path = tmp_path / "llm.jsonl"
+    cache = LLMResponseCache(path, max_entries=3)
+    for i in range(7):
+        cache.put("m", [{"role": "user", "content": f"q{i}"}], 0.1, 64, f"a{i}")
+        # the journal never grows past twice the cap
+        assert len(path.read_text(encoding="utf-8").splitlines()) <= 6
+
+    reloaded = LLMResponseCache(path, max_entries=3)
+    assert reloaded.stats()["entries"] == 3
+    assert reloaded.get("m", [{"role": "user", "content": "q6"}], 0.1, 64) == "a6"
+    assert reloaded.get("m", [{"role": "user", "content": "q3"}], 0.1, 64) is None
+    assert all("key" in json.loads(line) for line in path.read_text(encoding="utf-8").splitlines())
+
+
+@pytest.fixture
+def model_calls(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_http(messages, temperature, max_tokens):
+        calls.append(messages)
+        return f"answer {len(calls)}"
+
+    cache = LLMResponseCache(tmp_path / "llm.jsonl")
+    monkeypatch.setattr(ollama_services, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(ollama_services, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(ollama_services, "_chat_via_http", fake_http)
+    return calls
+
+
+def test_llm_chat_does_not_cache_by_default(model_calls):
+    assert ollama_services.llm_chat(None, "hello") == "answer 1"
+    assert ollama_services.llm_chat(None, "hello") == "answer 2"
+    assert len(model_calls) == 2
+
+
+def test_llm_chat_caches_when_asked(model_calls):
+    assert ollama_services.llm_chat(None, "hello", use_cache=True) == "answer 1"
+    assert ollama_services.llm_chat(None, "hello", use_cache=True) == "answer 1"
+    assert len(model_calls) == 1
+
+
+def test_llm_chat_only_caches_valid_answers(model_calls):
+    valid = lambda text: text.endswith("2")
+    assert ollama_services.llm_chat(None, "hello", use_cache=True, validate=valid) == "answer 1"
+    assert ollama_services.llm_chat(None, "hello", use_cache=True, validate=valid) == "answer 2"
+    assert ollama_services.llm_chat(None, "hello", use_cache=True, validate=valid) == "answer 2"
+    assert len(model_calls) == 2
@@ -0,0 +1,63 @@
+"""
+tests/test_vector_backends.py
+Exact NumPy flat backend.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from rag.vector_backends import FlatNumpyBackend
+
+VECTORS = {
+    "a": [1.0, 0.0, 0.0],
+    "b": [0.8, 0.6, 0.0],
+    "c": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def backend(tmp_path):
+    flat = FlatNumpyBackend(tmp_path, "corpus", embedding_fn=None)
+    flat.upsert(
+        ids=list(VECTORS),
+        documents=[f"doc {k}" for k in VECTORS],
+        metadatas=[{"session_id": "s1" if k != "c" else "s2"} for k in VECTORS],
+        embeddings=list(VECTORS.values()),
+    )
+    return flat
+
+
+def test_query_ranks_by_cosine_distance(backend):
+    out = backend.query([[2.0, 0.0, 0.0]], n_results=2)
+    assert out["ids"] == [["a", "b"]]
+    assert out["documents"] == [["doc a", "doc b"]]
+    assert out["distances"][0] == pytest.approx([0.0, 0.2], abs=1e-3)
+
+
+def test_where_filters_metadata(backend):
+    out = backend.query([[1.0, 0.0, 0.0]], n_results=3, where={"session_id": "s2"})
+    assert out["ids"] == [["c"]]
+
+
+def test_upsert_overwrites_in_place_and_reloads(backend, tmp_path):
+    backend.upsert(ids=["a"], documents=["doc a v2"], metadatas=[{}], embeddings=[[0.0, 1.0, 0.0]])
+    assert backend.count() == 3
+
+    reloaded = FlatNumpyBackend(tmp_path, "corpus", embedding_fn=None)
+    assert reloaded.count() == 3
+    assert reloaded.existing_ids(["a", "c", "z"]) == {"a", "c"}
+    out = reloaded.query([[0.0, 1.0, 0.0]], n_results=1)
+    assert out["ids"] == [["a"]] and out["documents"] == [["doc a v2"]]
+
+
+def test_load_skips_records_past_the_end(backend, tmp_path):
+    # A record that skips rows (out-of-order or truncated log) has no vector to point at
+    with (tmp_path / "corpus.jsonl").open("a", encoding="utf-8") as fh:
+        fh.write(json.dumps({"row": 7, "id": "gap", "dim": 3, "document": "x", "metadata": {}}) + "\n")
+        fh.write('{"row": 3, "id": "torn"')
+    reloaded = FlatNumpyBackend(tmp_path, "corpus", embedding_fn=None)
+    assert reloaded.count() == 3
+    assert reloaded.existing_ids(["gap", "torn"]) == set()
+    assert np.asarray(reloaded._matrix).shape == (3, 3)
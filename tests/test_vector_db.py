@@ -0,0 +1,69 @@
+"""
+tests/test_vector_db.py
+VectorDB chunk ids and document ingestion.
+"""
+
+import io
+import shutil
+
+import pytest
+from flask import Flask
+
+from rag.vector_db import VectorDB
+
+LEASE = "\n".join(f"Clause {i}: the tenant shall pay rent of {i * 100} rupees by the fifth day." for i in range(80))
+
+
+@pytest.fixture
+def vdb(tmp_path, hash_embeddings):
+    return VectorDB(tmp_path / "store", collection_name="uploads", backend="flat")
+
+
+def test_add_skips_chunks_already_stored(vdb):
+    docs = [{"content": "first clause", "metadata": {"source": "a.txt"}}, {"content": "second clause", "metadata": {"source": "a.txt"}}]
+    assert vdb.add(docs) == 2
+    assert vdb.add(docs) == 0
+    assert vdb.backend.count() == 2
+
+
+def test_reindexing_a_renamed_copy_writes_nothing(vdb, tmp_path):
+    original = tmp_path / "lease.txt"
+    original.write_text(LEASE, encoding="utf-8")
+    copy = tmp_path / "lease_1.txt"
+    shutil.copy(original, copy)
+
+    first = vdb.process_and_embed_document(original, session_id="s1")
+    assert first["new_chunks"] > 0
+    again = vdb.process_and_embed_document(copy, session_id="s1")
+    assert again == {"inserted_chunks": first["inserted_chunks"], "new_chunks": 0}
+    assert vdb.backend.count() == first["new_chunks"]
+
+    # The same document in another session is stored separately
+    other = vdb.process_and_embed_document(copy, session_id="s2")
+    assert other["new_chunks"] == first["new_chunks"]
+
+
+def test_reupload_is_idempotent(vdb, tmp_path, monkeypatch):
+    from routes import rag_routes
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rag_routes, "_UPLOAD_VDB", vdb)
+    app = Flask(__name__)
+    app.register_blueprint(rag_routes.bp)
+    client = app.test_client()
+
+    def upload(text):
+        data = {"files": (io.BytesIO(text.encode("utf-8")), "lease.txt"), "wait": "1"}
+        resp = client.post("/api/upload", data=data, content_type="multipart/form-data")
+        assert resp.status_code == 200
+        return resp.get_json()["results"][0]
+
+    first = upload(LEASE)
+    assert first["file"] == "lease.txt" and first["new_chunks"] > 0
+    second = upload(LEASE)
+    assert second == {**first, "new_chunks": 0}
+    assert sorted(p.name for p in (tmp_path / "data" / "pdfs").iterdir()) == ["lease.txt"]
+
+    # A different file under a taken name is kept alongside, not overwritten
+    third = upload(LEASE + "\nClause 99: amended.")
+    assert third["file"] == "lease_1.txt"
@@ -6,8 +6,9 @@ Helper utilities for document generation and file management.
 import os
 import uuid
 import base64
+import hashlib
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 
 
 def ensure_generated_dir() -> str:
@@ -79,3 +80,27 @@ def decode_base64_image(base64_string: str, filename: str = None) -> str:
         f.write(image_data)
     
     return image_path
+
+
+def file_sha256(source: Union[str, Path, BinaryIO]) -> str:
+    """
+    Hex SHA-256 of a file's contents, read in blocks.
+    
+    Args:
+        source: Path to the file, or a binary file object (read from its
+            current position, which is restored afterwards)
+    
+    Returns:
+        64-character hex digest
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (str, Path)):
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    start = source.tell()
+    for block in iter(lambda: source.read(1024 * 1024), b""):
+        digest.update(block)
+    source.seek(start)
+    return digest.hexdigest()
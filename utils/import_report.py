@@ -0,0 +1,75 @@
+"""
+utils/import_report.py
+Import-time report for the backend.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+prints the slowest top-level packages by import self time (summed over each
+package's modules, so nested imports are not counted twice), plus peak RSS,
+so regressions in start-up cost (a heavy library imported eagerly again) are
+easy to spot:
+
+    python -m utils.import_report            # imports app
+    python -m utils.import_report services.docgen_services --top 15
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+\d+\s+\|\s*(\S+)")
+
+
+def measure(module: str = "app") -> Tuple[List[Tuple[str, int]], int, float]:
+    """Import `module` in a subprocess.
+
+    Returns ([(top-level package, µs)] slowest first, total µs, peak RSS in MB).
+    A package's time is the self time of all its modules, so nested imports
+    are not counted twice.
+    """
+    code = (
+        f"import {module}, resource, sys; "
+        "sys.stdout.write(str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(ROOT),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+    per_package: Dict[str, int] = {}
+    total = 0
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if not m:
+            continue
+        self_time, package = int(m.group(1)), m.group(2).split(".")[0]
+        per_package[package] = per_package.get(package, 0) + self_time
+        total += self_time
+    # ru_maxrss is KiB on Linux
+    rss_mb = int(proc.stdout.strip() or 0) / 1024
+    ranked = sorted(per_package.items(), key=lambda item: item[1], reverse=True)
+    return ranked, total, rss_mb
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Report import time of a backend module.")
+    parser.add_argument("module", nargs="?", default="app")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    ranked, total, rss_mb = measure(args.module)
+    print(f"import {args.module}: {total / 1e6:.2f}s, peak RSS {rss_mb:.0f} MB")
+    for package, micros in ranked[: args.top]:
+        print(f"  {micros / 1e3:9.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    main()
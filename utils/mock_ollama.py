@@ -0,0 +1,257 @@
+"""
+utils/mock_ollama.py
+Local stand-in for Ollama's /api/chat, for benchmarks and load tests.
+
+Serves streaming (NDJSON) and non-streaming chat responses at a configurable
+time-to-first-token and token rate, so the whole Flask stack (llm_chat,
+stream_llm_chat, the agent loop) can be exercised on a CPU-only box without
+a model, and regressions in our own code are not hidden behind model latency:
+
+    python -m utils.mock_ollama --port 11435 --ttft-ms 300 --tokens-per-sec 25
+    OLLAMA_HOST=http://127.0.0.1:11435 python app.py
+
+Responses are canned by system prompt: the planner gets a valid plan (or a
+JSON field list for the field-discovery prompt), the evaluator a success
+report, everything else filler prose of --answer-tokens tokens. --plan-file
+replaces the built-in plan. --error-rate answers a fraction of requests with
+HTTP 500; --disconnect-rate drops a fraction of streams halfway through.
+--parallel caps concurrent generations like OLLAMA_NUM_PARALLEL; extra
+requests queue.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from utils.prompts import EVALUATOR_SYS_PROMPT, PLANNER_SYS_PROMPT
+
+DEFAULT_PLAN: Dict[str, Any] = {
+    "goal": "Draft the requested document",
+    "rationale": "Look up the governing provisions, then generate the document.",
+    "steps": [
+        {
+            "step_id": 1,
+            "title": "Find relevant provisions",
+            "tool": "rag_search",
+            "input": {"query": "rental agreement essential terms", "top_k": 3},
+            "expectations": "Relevant statutory provisions",
+        },
+        {
+            "step_id": 2,
+            "title": "Generate document",
+            "tool": "doc_generate",
+            "input": {
+                "type": "pdf",
+                "title": "Rental Agreement",
+                "content": [
+                    {"h1": "RENTAL AGREEMENT"},
+                    {"p": "This agreement is made between the Landlord and the Tenant."},
+                    {"table": [["Item", "Value"], ["Rent", "Rs. 20,000 per month"], ["Term", "11 months"]]},
+                ],
+            },
+            "expectations": "A downloadable PDF",
+        },
+    ],
+    "success_criteria": ["Document generated"],
+    "max_iterations": 3,
+    "next_steps": ["Review the draft", "Fill in party details", "Sign and register the agreement"],
+}
+
+EVALUATION = {"success": True, "summary": "All steps completed.", "sources": []}
+
+FIELDS = ["landlord_name", "tenant_name", "property_address", "monthly_rent", "start_date"]
+
+_FILLER = (
+    "Under the applicable provisions the parties must record the essential terms in writing, "
+    "including the consideration, the duration and the obligations of each party. "
+)
+
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text) or [text]
+
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 11435),
+        ttft_ms: float = 200.0,
+        tokens_per_sec: float = 30.0,
+        answer_tokens: int = 200,
+        error_rate: float = 0.0,
+        disconnect_rate: float = 0.0,
+        parallel: int = 4,
+        plan: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.ttft = max(0.0, ttft_ms) / 1000
+        self.token_interval = 1 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.disconnect_rate = disconnect_rate
+        self.slots = threading.BoundedSemaphore(parallel) if parallel > 0 else None
+        self.plan = plan or DEFAULT_PLAN
+        self.random = random.Random(seed)
+        self.requests = 0
+        super().__init__(address, _Handler)
+
+    def reply_for(self, messages: List[Dict[str, Any]], max_tokens: Optional[int]) -> str:
+        system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+        prompt = messages[-1].get("content", "") if messages else ""
+        if system == PLANNER_SYS_PROMPT:
+            if "required field names" in prompt:
+                return json.dumps(FIELDS)
+            return json.dumps(self.plan)
+        if system == EVALUATOR_SYS_PROMPT:
+            return json.dumps(EVALUATION)
+        count = self.answer_tokens if not max_tokens or max_tokens < 0 else min(self.answer_tokens, max_tokens)
+        words = _tokens(_FILLER)
+        return "".join(words[i % len(words)] for i in range(count)).strip()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload: Dict[str, Any]) -> None:
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "mock"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        server: MockOllamaServer = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        if self.path != "/api/chat":
+            self._send_json(404, {"error": "not found"})
+            return
+        server.requests += 1
+        if server.random.random() < server.error_rate:
+            self._send_json(500, {"error": "injected failure"})
+            return
+
+        model = body.get("model", "mock")
+        stream = body.get("stream", True)
+        options = body.get("options") or {}
+        tokens = _tokens(server.reply_for(body.get("messages") or [], options.get("num_predict")))
+
+        if server.slots is not None:
+            server.slots.acquire()
+        try:
+            started = time.monotonic()
+            time.sleep(server.ttft)
+            if not stream:
+                time.sleep(server.token_interval * (len(tokens) - 1))
+                self._send_json(200, self._final(model, started, len(tokens), "".join(tokens)))
+                return
+
+            drop_at = len(tokens) // 2 if server.random.random() < server.disconnect_rate else None
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i == drop_at:
+                    self.close_connection = True
+                    return
+                if i:
+                    time.sleep(server.token_interval)
+                self._write_chunk(
+                    {
+                        "model": model,
+                        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        "message": {"role": "assistant", "content": token},
+                        "done": False,
+                    }
+                )
+            self._write_chunk(self._final(model, started, len(tokens), ""))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            self.close_connection = True
+        finally:
+            if server.slots is not None:
+                server.slots.release()
+
+    @staticmethod
+    def _final(model: str, started: float, eval_count: int, content: str) -> Dict[str, Any]:
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": True,
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "eval_count": eval_count,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a mock Ollama /api/chat for load testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=200.0, help="delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0, help="0 sends all tokens at once")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="length of free-text answers")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 500")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="fraction of streams dropped halfway")
+    parser.add_argument("--parallel", type=int, default=4, help="concurrent generations (0 = unlimited)")
+    parser.add_argument("--plan-file", help="JSON plan returned to the planner instead of the built-in one")
+    parser.add_argument("--seed", type=int, help="random seed for error injection")
+    args = parser.parse_args()
+
+    plan = None
+    if args.plan_file:
+        with open(args.plan_file, "r", encoding="utf-8") as fh:
+            plan = json.load(fh)
+
+    server = MockOllamaServer(
+        (args.host, args.port),
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.error_rate,
+        disconnect_rate=args.disconnect_rate,
+        parallel=args.parallel,
+        plan=plan,
+        seed=args.seed,
+    )
+    print(f"Mock Ollama listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()